@@ -0,0 +1,169 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import itertools
+import multiprocessing
+import os
+import sys
+import time
+try:
+    import src.sudokusolver as solver
+    import src.utils as utils
+    import src.vectorsolver as vectorsolver
+except ModuleNotFoundError:
+    import sudokusolver as solver
+    import utils
+    import vectorsolver
+
+
+UNSOLVABLE = 'unsolvable'
+INVALID = 'invalid'
+MULTIPLE = 'multiple'
+# the puzzle hit the --timeout or --max-nodes limit
+GAVE_UP = 'gave up'
+
+
+def solve_line(line, options, unique=False):
+    try:
+        board = utils.board_from_line(line)
+    except ValueError:
+        return INVALID
+    puzzle = solver.SudokuSolver(board, **options)
+    if unique:
+        found = puzzle.count_solutions(2)
+        if found is None:
+            return GAVE_UP
+        if found > 1:
+            return MULTIPLE
+        solution = puzzle.problem if found else False
+    else:
+        solution = puzzle.solve(render=False)
+    if solution is None:
+        return GAVE_UP
+    if solution is False:
+        return UNSOLVABLE
+    return utils.line_from_board(solution)
+
+def solve_chunk(lines, options, vectorized=False, unique=False):
+    if not vectorized:
+        return [solve_line(line, options, unique) for line in lines]
+    results, boards = [INVALID] * len(lines), {}
+    for i, line in enumerate(lines):
+        try:
+            board = utils.board_from_line(line)
+        except ValueError:
+            continue
+        if board.shape == vectorsolver.SHAPE:
+            boards[i] = board
+        else:
+            results[i] = solve_line(line, options, unique)
+    if boards:
+        batch = vectorsolver.VectorSolver(list(boards.values()), unique=unique, **options)
+        solutions = batch.solve()
+        for i, solution, solved, multiple, gave_up in zip(boards, solutions, batch.solved, batch.multiple, batch.gave_up):
+            if solved:
+                results[i] = utils.line_from_board(solution)
+            elif gave_up:
+                results[i] = GAVE_UP
+            else:
+                results[i] = MULTIPLE if multiple else UNSOLVABLE
+    return results
+
+def read_puzzles(f):
+    for line in f:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+class BatchSolver():
+
+    def __init__(self, workers=None, chunksize=256, backlog=4, vectorized=False, unique=False, **options):
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        # chunks allowed in flight per worker; bounds memory on arbitrarily long inputs
+        self.backlog = backlog
+        # keyword arguments for every SudokuSolver
+        self.options = options
+        self.vectorized = vectorized
+        self.unique = unique
+        self.count = 0
+        self.elapsed = 0.
+
+    def solve(self, puzzles):
+        return self.map(solve_chunk, puzzles, self.options, self.vectorized, self.unique)
+
+    def map(self, function, puzzles, *args):
+        # yields function(chunk, *args) for every chunk of puzzles, flattened, in input order
+        start = time.perf_counter()
+        chunks = chunked(puzzles, self.chunksize)
+        try:
+            if self.workers == 1:
+                for chunk in chunks:
+                    yield from self._emit(function(chunk, *args))
+            else:
+                with multiprocessing.Pool(self.workers) as pool:
+                    pending = collections.deque()
+                    for chunk in chunks:
+                        pending.append(pool.apply_async(function, (chunk,) + args))
+                        if len(pending) >= self.workers * self.backlog:
+                            yield from self._emit(pending.popleft().get())
+                    while pending:
+                        yield from self._emit(pending.popleft().get())
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def _emit(self, results):
+        for result in results:
+            self.count += 1
+            yield result
+
+    def summary(self, verb='Solved'):
+        rate = self.count / self.elapsed if self.elapsed else 0.
+        return "%s %d puzzles in %.2f seconds (%.1f puzzles/sec) on %d worker(s)" % (
+            verb, self.count, self.elapsed, rate, self.workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve puzzles given one per line: 81 characters (1-9, '.' or '0' for blanks) "
+                                     "for 9x9 boards, or 256 (1-9, A-G) and 625 (1-9, A-P) for 16x16 and 25x25.")
+    parser.add_argument('input', nargs='?', default='-', help="puzzle file, or - for stdin (default)")
+    parser.add_argument('-o', '--output', default='-', help="solution file, or - for stdout (default)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('-c', '--chunksize', type=int, default=256, help="puzzles sent to a worker at a time")
+    parser.add_argument('--strategy', choices=['copy', 'trail', 'backjump'], default='copy',
+                        help="search strategy; backjump skips levels unrelated to a failure and learns nogoods")
+    parser.add_argument('--backend', choices=['bitmask', 'dlx'], default='bitmask', help="solver backend")
+    parser.add_argument('--propagation', choices=['singles', 'advanced'], default='singles',
+                        help="advanced also applies pairs, triples, pointing and box/line reduction before each branch")
+    parser.add_argument('--vectorized', action='store_true', help="propagate each chunk as one NumPy batch, searching only puzzles that stall")
+    parser.add_argument('--unique', action='store_true', help="also check uniqueness; puzzles with several solutions come out as 'multiple'")
+    parser.add_argument('--timeout', type=float, default=None, help="seconds allowed per puzzle; slower ones come out as 'gave up'")
+    parser.add_argument('--max-nodes', type=int, default=None, help="search nodes allowed per puzzle; bigger searches come out as 'gave up'")
+    args = parser.parse_args(argv)
+
+    infile = sys.stdin if args.input == '-' else open(args.input)
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    batch = BatchSolver(workers=args.workers, chunksize=args.chunksize, vectorized=args.vectorized,
+                        unique=args.unique, strategy=args.strategy, backend=args.backend,
+                        propagation=args.propagation, timeout=args.timeout, max_nodes=args.max_nodes)
+    try:
+        for result in batch.solve(read_puzzles(infile)):
+            outfile.write(result + '\n')
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    print(batch.summary(), file=sys.stderr)
+
+
+if __name__=='__main__':
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/python3
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+try:
+    import src.batchsolver as batchsolver
+    import src.sudokusolver as solver
+    import src.utils as utils
+    import src.vectorsolver as vectorsolver
+except ModuleNotFoundError:
+    import batchsolver
+    import sudokusolver as solver
+    import utils
+    import vectorsolver
+
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'resources', 'puzzles')
+
+# solver keyword arguments for every benchmarked backend/mode; 'vectorized' solves the
+# whole corpus as one VectorSolver batch and has no per-puzzle latency
+CONFIGS = {
+    'bitmask': {},
+    'bitmask-trail': {'strategy': 'trail'},
+    'bitmask-backjump': {'strategy': 'backjump'},
+    'bitmask-advanced': {'propagation': 'advanced'},
+    'dlx': {'backend': 'dlx'},
+    'dlx-advanced': {'backend': 'dlx', 'propagation': 'advanced'},
+    'vectorized': None,
+}
+PERCENTILES = (50, 90, 99)
+
+
+def load_corpora(names=None):
+    corpora = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if names and name not in names:
+            continue
+        with open(path) as f:
+            corpora[name] = [utils.board_from_line(line) for line in batchsolver.read_puzzles(f)]
+    return corpora
+
+def run_config(boards, options):
+    latencies, nodes, solved = [], [], 0
+    start = time.perf_counter()
+    if options is None:
+        batch = vectorsolver.VectorSolver(boards)
+        solutions = batch.solve()
+        solved = sum(utils.is_solution(solution, board) for solution, board in zip(solutions, boards))
+    else:
+        for board in boards:
+            puzzle_start = time.perf_counter()
+            puzzle = solver.SudokuSolver(board, **options)
+            solution = puzzle.solve(render=False)
+            latencies.append(time.perf_counter() - puzzle_start)
+            nodes.append(puzzle.stats.nodes)
+            # counted only if it really is a solution; gave up (None) and no solution don't count
+            solved += solution is not None and solution is not False and utils.is_solution(solution, board)
+    return time.perf_counter() - start, latencies, nodes, solved
+
+def peak_memory(boards, options):
+    # a separate pass, since tracing allocations skews the timings
+    tracemalloc.start()
+    try:
+        run_config(boards, options)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+def benchmark(corpus, boards, name, options, repeat=1, memory=True):
+    runs = [run_config(boards, options) for _ in range(repeat)]
+    elapsed, latencies, nodes, solved = min(runs, key=lambda run: run[0])
+    result = {
+        'corpus': corpus,
+        'config': name,
+        'options': options,
+        'puzzles': len(boards),
+        'solved': solved,
+        'time': elapsed,
+        'throughput': len(boards) / elapsed if elapsed else None,
+        'latency': None,
+        'nodes': None,
+        'peak_memory': peak_memory(boards, options) if memory else None,
+    }
+    if latencies:
+        result['latency'] = dict(
+            [('p%d' % p, float(np.percentile(latencies, p))) for p in PERCENTILES] +
+            [('mean', float(np.mean(latencies))), ('max', float(np.max(latencies)))]
+        )
+        result['nodes'] = {'mean': float(np.mean(nodes)), 'max': int(np.max(nodes))}
+    return result
+
+def compare(results, baseline, tolerance):
+    # flags every corpus/config whose throughput or median latency got worse by more than tolerance
+    previous = {(r['corpus'], r['config']): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        old = previous.get((result['corpus'], result['config']))
+        if old is None:
+            continue
+        if old['throughput'] and result['throughput'] < old['throughput'] * (1 - tolerance):
+            regressions.append("%s/%s: throughput %.1f -> %.1f puzzles/sec" % (
+                result['corpus'], result['config'], old['throughput'], result['throughput']))
+        if old['latency'] and result['latency'] and result['latency']['p50'] > old['latency']['p50'] * (1 + tolerance):
+            regressions.append("%s/%s: p50 latency %.2f -> %.2f ms" % (
+                result['corpus'], result['config'], old['latency']['p50'] * 1e3, result['latency']['p50'] * 1e3))
+    return regressions
+
+def format_result(result):
+    latency = result['latency'] or {}
+    memory = result['peak_memory']
+    return "%-12s %-17s %5d/%-5d %10.1f/s  p50 %8s  p90 %8s  p99 %8s  max %8s  peak %s" % (
+        result['corpus'], result['config'], result['solved'], result['puzzles'], result['throughput'] or 0,
+        *['%.2fms' % (latency[k] * 1e3) if k in latency else '-' for k in ('p50', 'p90', 'p99', 'max')],
+        '%.1fKiB' % (memory / 1024) if memory is not None else '-',
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every solver backend/mode on the bundled puzzle corpora.")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="where to save the JSON results")
+    parser.add_argument('--corpora', nargs='+', help="corpus names to run (default: all in resources/puzzles)")
+    parser.add_argument('--configs', nargs='+', choices=list(CONFIGS), help="configurations to run (default: all)")
+    parser.add_argument('--repeat', type=int, default=1, help="timing runs per configuration; the fastest is kept")
+    parser.add_argument('--no-memory', action='store_true', help="skip the peak memory pass")
+    parser.add_argument('--compare', help="earlier JSON results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    results = []
+    for corpus, boards in load_corpora(args.corpora).items():
+        for name in args.configs or CONFIGS:
+            options = CONFIGS[name]
+            if options is None and boards[0].shape != vectorsolver.SHAPE:
+                continue
+            result = benchmark(corpus, boards, name, options, repeat=args.repeat, memory=not args.no_memory)
+            print(format_result(result))
+            results.append(result)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'date': datetime.datetime.now().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'results': results,
+        }, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__=='__main__':
+    main()
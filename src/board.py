@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+import numpy as np
+
+
+# The state of one game. The givens, the user's answers and the solver's digits are int8
+# grids with -1 for blank, which is the solver's input format, so the givens go to it as
+# they are. Corner and center pencil marks are masks with bit d - 1 set for digit d.
+# Everything is indexed [row, column].
+class Board():
+    __slots__ = ('size', 'givens', 'answers', 'solver', 'corners', 'centers')
+
+    def __init__(self, size=9):
+        self.size = size
+        self.givens = np.full((size, size), -1, dtype=np.int8)
+        self.answers = np.full((size, size), -1, dtype=np.int8)
+        self.solver = np.full((size, size), -1, dtype=np.int8)
+        self.corners = np.zeros((size, size), dtype=np.uint16 if size <= 16 else np.uint32)
+        self.centers = np.zeros((size, size), dtype=self.corners.dtype)
+
+    def __array__(self, dtype=None, copy=None):
+        # np.array(board), and so SudokuSolver(board), sees the givens; np.asarray(board)
+        # gets them without a copy
+        if dtype is not None and dtype != self.givens.dtype:
+            return self.givens.astype(dtype)
+        return self.givens.copy() if copy else self.givens
+
+    def copy(self):
+        board = Board.__new__(Board)
+        board.size = self.size
+        for name in Board.__slots__[1:]:
+            setattr(board, name, getattr(self, name).copy())
+        return board
+
+    def set_problem(self):
+        # the answers so far become givens
+        np.copyto(self.givens, self.answers, where=self.givens <= 0)
+
+    def filled(self):
+        # givens and answers, e.g. to check a finished board
+        return np.maximum(self.givens, self.answers)
+
+    def combined(self):
+        return np.maximum(self.filled(), self.solver)
+
+    def given(self, row, column):
+        return self.givens[row, column] > 0
+
+    @staticmethod
+    def toggle(marks, row, column, digit):
+        marks[row, column] ^= 1 << (digit - 1)
+
+    @staticmethod
+    def digits(mask):
+        mask = int(mask)
+        return [d + 1 for d in range(mask.bit_length()) if mask >> d & 1]
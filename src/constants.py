@@ -5,7 +5,14 @@ SCROT_PATH = '/tmp/scrot.png'
 TESSDATA_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'resources', 'training')
 TRAIN_SIZE = (28, 28)
 CONTENT_CUTOFF = 5
-SOLVER_SLEEP = 0.00
+# redraws per second of a running solve; the solver itself never waits on drawing
+SOLVER_FPS = 30
+# solve trace entries replayed per frame, as a power of ten
+REPLAY_SPEED = 2
+# edits kept for undo; each holds only the cells it changed
+UNDO_LIMIT = 10000
+# seconds before Solve Problem gives up
+SOLVER_TIMEOUT = 30
 
 ROWS = 9
 COLUMNS = 9
@@ -46,51 +53,3 @@ DIRECTION_KEYS = [ UP, LEFT, DOWN, RIGHT ]
 SYMBOLS = ["exclam", "at", "numbersign", "dollar", "percent", "asciicircum", "ampersand", "asterisk", "parenleft"]
 DIGITS = ['1', '2', '3', '4', '5', '6', '7', '8', '9']
 SYMBOLS_TO_DIGITS = dict(zip(SYMBOLS, DIGITS))
-
-INITIAL_BOARD = [
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-]
-
-USER_BOARD = [
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-    [-1, -1, -1, -1, -1, -1, -1, -1, -1],
-]
-
-USER_CORNERS = [
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-]
-
-USER_CENTERS = [
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-    [set(), set(), set(), set(), set(), set(), set(), set(), set()],
-]
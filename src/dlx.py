@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+
+
+# Knuth's Algorithm X over a dancing links matrix, stored as flat index lists:
+# node 0 is the root, nodes 1..n are the column headers, the rest are row nodes
+class DancingLinks():
+
+    def __init__(self, ncolumns, rows, callback=None):
+        self.L = [i - 1 for i in range(ncolumns + 1)]
+        self.R = [i + 1 for i in range(ncolumns + 1)]
+        self.L[0], self.R[ncolumns] = ncolumns, 0
+        self.U = list(range(ncolumns + 1))
+        self.D = list(range(ncolumns + 1))
+        self.C = list(range(ncolumns + 1))
+        self.S = [0] * (ncolumns + 1)
+        self.row_of = [-1] * (ncolumns + 1)
+        # called with a row id every time that row is tried
+        self.callback = callback
+        self.nodes = 0
+        # nodes whose subtree held no exact cover
+        self.backtracks = 0
+        self.max_depth = 0
+        self.found = 0
+        self.solution = []
+        for rowid, columns in rows:
+            self.add_row(rowid, columns)
+
+    def add_row(self, rowid, columns):
+        first = len(self.C)
+        last = first + len(columns) - 1
+        for i, col in enumerate(columns):
+            c = col + 1
+            node = first + i
+            self.C.append(c)
+            self.row_of.append(rowid)
+            self.L.append(node - 1 if node > first else last)
+            self.R.append(node + 1 if node < last else first)
+            self.U.append(self.U[c])
+            self.D.append(c)
+            self.D[self.U[c]] = node
+            self.U[c] = node
+            self.S[c] += 1
+
+    def cover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        R[L[c]] = R[c]
+        L[R[c]] = L[c]
+        i = D[c]
+        while i != c:
+            j = R[i]
+            while j != i:
+                D[U[j]] = D[j]
+                U[D[j]] = U[j]
+                S[C[j]] -= 1
+                j = R[j]
+            i = D[i]
+
+    def uncover(self, c):
+        L, R, U, D, C, S = self.L, self.R, self.U, self.D, self.C, self.S
+        i = U[c]
+        while i != c:
+            j = L[i]
+            while j != i:
+                S[C[j]] += 1
+                D[U[j]] = j
+                U[D[j]] = j
+                j = L[j]
+            i = U[i]
+        R[L[c]] = c
+        L[R[c]] = c
+
+    def search(self):
+        # yields self.solution (a list of row ids) for every exact cover; copy it to keep it
+        self.nodes += 1
+        self.max_depth = max(self.max_depth, len(self.solution))
+        R, S = self.R, self.S
+        if R[0] == 0:
+            self.found += 1
+            yield self.solution
+            return
+        c = R[0]
+        best, size = c, S[c]
+        while c and size > 1:
+            if S[c] < size:
+                best, size = c, S[c]
+            c = R[c]
+        if not size:
+            self.backtracks += 1
+            return
+        found = self.found
+        self.cover(best)
+        r = self.D[best]
+        while r != best:
+            if self.callback is not None:
+                self.callback(self.row_of[r])
+            self.solution.append(self.row_of[r])
+            j = R[r]
+            while j != r:
+                self.cover(self.C[j])
+                j = R[j]
+            yield from self.search()
+            j = self.L[r]
+            while j != r:
+                self.uncover(self.C[j])
+                j = self.L[j]
+            self.solution.pop()
+            r = self.D[r]
+        self.uncover(best)
+        if self.found == found:
+            self.backtracks += 1
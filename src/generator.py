@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import numpy as np
+try:
+    import src.sudokusolver as solver
+    import src.utils as utils
+except ModuleNotFoundError:
+    import sudokusolver as solver
+    import utils
+
+
+# cells that are given or blanked together: the cell itself and its images under the symmetry
+SYMMETRIES = {
+    'none': lambda row, col, size: [(row, col)],
+    'rotational': lambda row, col, size: [(row, col), (size - 1 - row, size - 1 - col)],
+    'mirror': lambda row, col, size: [(row, col), (row, size - 1 - col)],
+    'diagonal': lambda row, col, size: [(row, col), (col, row)],
+}
+
+# search nodes one uniqueness check may take before the clue it is about is kept; on
+# 9x9 no check comes near it, but near minimal a 25x25 one can otherwise run for hours
+CHECK_NODES = 5000
+
+
+def random_grid(box, rng, options):
+    # a random completed grid: random candidates go into random cells, each one propagated,
+    # until the first `size` placements; the search then finishes the grid
+    size = box * box
+    while True:
+        puzzle = solver.SudokuSolver(np.full((size, size), -1), **options)
+        domains = puzzle.domains
+        for x in rng.sample(puzzle.variables, size):
+            if puzzle.popcount(domains[x]) > 1:
+                domains = puzzle.assign(domains, x, rng.choice(list(puzzle.values(domains[x]))))
+                if not domains:
+                    break
+        if domains:
+            domains = puzzle.search(domains)
+        if domains:
+            return puzzle.grid(domains)
+
+def symmetry_groups(size, symmetry):
+    groups = set()
+    for row in range(size):
+        for col in range(size):
+            groups.add(tuple(sorted(set(SYMMETRIES[symmetry](row, col, size)))))
+    return sorted(groups)
+
+def propagated_domains(puzzle, board):
+    # the domains SudokuSolver(board) would start from, built straight from the givens of
+    # each unit; far cheaper than assigning them one by one when most cells are given, but
+    # only valid for boards that are part of a known solution
+    tables = puzzle.tables
+    values = [int(v) for v in board.flatten()]
+    placed = [0] * len(tables.units)
+    for u, unit in enumerate(tables.units):
+        for x in unit:
+            if values[x] > 0:
+                placed[u] |= 1 << (values[x] - 1)
+    domains = [
+        1 << (val - 1) if val > 0 else tables.all_digits & ~sum_units(placed, tables.cell_unit_ids[x])
+        for x, val in enumerate(values)
+    ]
+    for x, val in enumerate(values):
+        if val <= 0 and puzzle.popcount(domains[x]) == 1:
+            for y in puzzle.peers[x]:
+                if not puzzle.eliminate(domains, y, domains[x]):
+                    return False
+    # hidden singles; the ones they lead to are found by eliminate() as usual
+    for u, unit in enumerate(tables.units):
+        for val in puzzle.values(tables.all_digits & ~placed[u]):
+            bit = 1 << (val - 1)
+            places = [x for x in unit if domains[x] & bit]
+            if not places:
+                return False
+            if len(places) == 1 and domains[places[0]] != bit and not puzzle.assign(domains, places[0], val):
+                return False
+    return domains
+
+def sum_units(placed, unit_ids):
+    mask = 0
+    for u in unit_ids:
+        mask |= placed[u]
+    return mask
+
+def has_other_solution(puzzle, board, solution, cells):
+    # every solution of `board` other than `solution` differs from it in one of the blanked
+    # `cells` (the rest was already unique), so uniqueness is one refuted search per cell,
+    # which usually fails on propagation alone, instead of searching for a second solution.
+    # A check that hits the puzzle's limits counts as a yes, so the clues stay.
+    domains = propagated_domains(puzzle, board)
+    if not domains:
+        return False
+    puzzle.start_stats()
+    try:
+        for row, col in cells:
+            trial = domains[:]
+            if puzzle.eliminate(trial, row * puzzle.size + col, 1 << (int(solution[row][col]) - 1)):
+                if puzzle.search(trial) is not False:
+                    return True
+    except solver.GaveUp:
+        return True
+    return False
+
+def generate_puzzle(seed, box=3, symmetry='none', target=None, options=None, check_nodes=CHECK_NODES):
+    # a puzzle with a unique solution, found by blanking the givens of a random grid in random
+    # order, group by group, while the solution stays unique. Without a target this ends with
+    # a minimal puzzle (a symmetric one can only be minimal up to its groups, and one whose
+    # uniqueness check ran past `check_nodes` stays given); with one, it stops once no more
+    # than `target` givens are left, or when nothing more can go.
+    options = options or {}
+    rng = random.Random(seed)
+    solution = random_grid(box, rng, options)
+    board = solution.copy()
+    givens = board.size
+    groups = symmetry_groups(board.shape[0], symmetry)
+    rng.shuffle(groups)
+    # only used for its tables, propagation and search
+    puzzle = solver.SudokuSolver(np.full(board.shape, -1), max_nodes=check_nodes, **options)
+    for cells in groups:
+        if target is not None and givens <= target:
+            break
+        trial = board.copy()
+        for cell in cells:
+            trial[cell] = -1
+        if not has_other_solution(puzzle, trial, solution, cells):
+            board = trial
+            givens -= len(cells)
+    return utils.line_from_board(board)
+
+
+class PuzzleGenerator():
+
+    def __init__(self, workers=None, chunksize=4, box=3, symmetry='none', target=None, seed=None,
+                 check_nodes=CHECK_NODES, **options):
+        if symmetry not in SYMMETRIES:
+            raise ValueError("Unknown symmetry %r" % symmetry)
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.box = box
+        self.symmetry = symmetry
+        self.target = target
+        self.check_nodes = check_nodes
+        # every puzzle gets its own seed drawn from this one, so a run is reproducible
+        # whatever the number of workers
+        self.seed = seed
+        # keyword arguments for every SudokuSolver
+        self.options = options
+        self.count = 0
+        self.elapsed = 0.
+
+    def generate(self, count):
+        # yields `count` puzzle lines, in no particular order with more than one worker
+        start = time.perf_counter()
+        rng = random.Random(self.seed)
+        tasks = ((rng.getrandbits(64), self.box, self.symmetry, self.target, self.options, self.check_nodes)
+                 for _ in range(count))
+        try:
+            if self.workers == 1:
+                for task in tasks:
+                    yield self._emit(generate_puzzle(*task))
+            else:
+                with multiprocessing.Pool(self.workers) as pool:
+                    for puzzle in pool.imap_unordered(generate_task, tasks, self.chunksize):
+                        yield self._emit(puzzle)
+        finally:
+            self.elapsed = time.perf_counter() - start
+
+    def _emit(self, puzzle):
+        self.count += 1
+        return puzzle
+
+    def summary(self):
+        rate = self.count / self.elapsed if self.elapsed else 0.
+        return "Generated %d puzzles in %.2f seconds (%.1f puzzles/sec) on %d worker(s)" % (
+            self.count, self.elapsed, rate, self.workers)
+
+
+def generate_task(task):
+    return generate_puzzle(*task)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate puzzles with a unique solution, one per line in the batch solver's format.")
+    parser.add_argument('count', type=int, help="number of puzzles")
+    parser.add_argument('-o', '--output', default='-', help="puzzle file, or - for stdout (default)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('-c', '--chunksize', type=int, default=4, help="puzzles sent to a worker at a time")
+    parser.add_argument('--size', type=int, choices=[9, 16, 25], default=9, help="board size")
+    parser.add_argument('--symmetry', choices=list(SYMMETRIES), default='none', help="symmetry of the givens")
+    parser.add_argument('--givens', type=int, default=None,
+                        help="stop blanking at this many givens (default: blank until the puzzle is minimal)")
+    parser.add_argument('--seed', type=int, default=None, help="seed for a reproducible run")
+    parser.add_argument('--propagation', choices=['singles', 'advanced'], default='singles',
+                        help="propagation used by the uniqueness checks")
+    parser.add_argument('--check-nodes', type=int, default=CHECK_NODES,
+                        help="search nodes per uniqueness check before the clue is kept (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    generator = PuzzleGenerator(workers=args.workers, chunksize=args.chunksize, box={9: 3, 16: 4, 25: 5}[args.size],
+                                symmetry=args.symmetry, target=args.givens, seed=args.seed,
+                                check_nodes=args.check_nodes, propagation=args.propagation)
+    try:
+        for puzzle in generator.generate(args.count):
+            outfile.write(puzzle + '\n')
+    finally:
+        if outfile is not sys.stdout:
+            outfile.close()
+    print(generator.summary(), file=sys.stderr)
+
+
+if __name__=='__main__':
+    main()
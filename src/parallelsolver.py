@@ -0,0 +1,188 @@
+#!/usr/bin/python3
+import argparse
+import multiprocessing
+import os
+import time
+import numpy as np
+try:
+    import src.sudokusolver as solver
+    import src.utils as utils
+except ModuleNotFoundError:
+    import sudokusolver as solver
+    import utils
+
+
+# how long the parent waits on workers before checking its own token again
+POLL_INTERVAL = 0.05
+
+# set in every worker: cancels the subproblems still running once the answer is known
+WORKER_TOKEN = None
+
+
+def init_worker(event):
+    global WORKER_TOKEN
+    WORKER_TOKEN = solver.CancellationToken(event)
+
+def solve_subproblem(task):
+    # (solutions found or None if cancelled, first solution, stats) for one subtree
+    domains, size, options, limit, timeout, max_nodes = task
+    puzzle = solver.SudokuSolver(np.full((size, size), -1), token=WORKER_TOKEN, timeout=timeout, max_nodes=max_nodes,
+                                 **options)
+    puzzle.domains = domains
+    if limit is None:
+        result = puzzle.solve(render=False)
+        found = None if result is None else int(result is not False)
+    else:
+        found = puzzle.count_solutions(limit)
+    return found, puzzle.problem if found else None, puzzle.stats
+
+
+# Solves one puzzle on several cores: the top of the search tree is expanded in this
+# process until there are `split` open subtrees per worker, which are then searched in a
+# process pool. Same results as SudokuSolver, though with several solutions which one
+# solve() returns depends on which worker gets there first.
+class ParallelSolver():
+
+    def __init__(self, problem, workers=None, split=4, token=None, timeout=None, max_nodes=None, **options):
+        self.workers = workers or os.cpu_count() or 1
+        self.split = split
+        # cancels the whole solve, from any thread
+        self.token = token
+        # limits of the whole solve: each subtree is given the time still left and an even
+        # share of the nodes still left, and the parent gives up once the deadline passes
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        # keyword arguments for every SudokuSolver, in this process and the workers
+        self.options = options
+        self.puzzle = solver.SudokuSolver(problem, token=token, timeout=timeout, max_nodes=max_nodes, **options)
+        self.problem = self.puzzle.problem
+        self.size = self.puzzle.size
+        self.stats = solver.SolveStats()
+
+    def solve(self):
+        found = self.run(None)
+        if found is None:
+            return None
+        return self.problem if found else False
+
+    def count_solutions(self, limit=2):
+        # every worker keeps counting until `limit` solutions are found between them
+        found = self.run(limit)
+        return found if found is None else min(found, limit)
+
+    def run(self, limit):
+        self.puzzle.render = False
+        self.puzzle.start_stats()
+        started = time.perf_counter()
+        self.stats = self.puzzle.stats
+        try:
+            subproblems, found = self.expand(limit) if self.puzzle.domains else ([], 0)
+        except solver.GaveUp as reason:
+            self.stats.gave_up = str(reason)
+            subproblems, found = [], None
+        if subproblems and not self.done(found, limit):
+            found = self.farm_out(subproblems, limit, found)
+            # a subtree that gave up may have held the missing solutions
+            if self.stats.gave_up and not self.done(found, limit):
+                found = None
+        self.stats.solutions = found or 0
+        self.stats.time = time.perf_counter() - started
+        return found
+
+    def done(self, found, limit):
+        return found is not None and found >= (1 if limit is None else limit)
+
+    def expand(self, limit):
+        # breadth-first over the top levels of the same tree SudokuSolver.search() explores;
+        # solutions met on the way are counted here
+        puzzle = self.puzzle
+        frontier, found = [(puzzle.domains[:], 0)], 0
+        while frontier and len(frontier) < self.workers * self.split:
+            domains, depth = frontier.pop(0)
+            if not puzzle.enter(domains, depth):
+                continue
+            x = puzzle.select_variable(domains)
+            if x is None:
+                if not found:
+                    puzzle.fill_problem(domains)
+                found += 1
+                if self.done(found, limit):
+                    return [], found
+                continue
+            for val in puzzle.values(domains[x]):
+                frontier.append((puzzle.branch(domains[:], x, val), depth + 1))
+        return [domains for domains, depth in frontier if domains], found
+
+    def farm_out(self, subproblems, limit, found):
+        event = multiprocessing.Event()
+        deadline = self.puzzle.deadline
+        timeout = None if deadline is None else max(0., deadline - time.perf_counter())
+        max_nodes = None
+        if self.max_nodes is not None:
+            max_nodes = max(1, (self.max_nodes - self.stats.nodes) // len(subproblems))
+        tasks = [(domains, self.size, self.options, limit, timeout, max_nodes) for domains in subproblems]
+        with multiprocessing.Pool(min(self.workers, len(tasks)), init_worker, (event,)) as pool:
+            results = pool.imap_unordered(solve_subproblem, tasks)
+            pending = len(tasks)
+            while pending:
+                if self.token is not None and self.token.cancelled:
+                    self.stats.gave_up = solver.CANCELLED
+                elif deadline is not None and time.perf_counter() > deadline:
+                    self.stats.gave_up = solver.TIMEOUT
+                if self.stats.gave_up in (solver.CANCELLED, solver.TIMEOUT):
+                    event.set()
+                    return None
+                try:
+                    subtree, solution, stats = results.next(POLL_INTERVAL)
+                except multiprocessing.TimeoutError:
+                    continue
+                pending -= 1
+                self.merge(stats)
+                if subtree is None:
+                    continue
+                if subtree and not found:
+                    self.problem[:] = solution
+                found += subtree
+                if self.done(found, limit):
+                    # the rest notice at their next node; the pool is torn down on exit anyway
+                    event.set()
+                    break
+        return found
+
+    def merge(self, stats):
+        self.stats.nodes += stats.nodes
+        self.stats.backtracks += stats.backtracks
+        self.stats.max_depth = max(self.stats.max_depth, stats.max_depth)
+        self.stats.assignments += stats.assignments
+        self.stats.eliminations += stats.eliminations
+        self.stats.techniques.update(stats.techniques)
+        self.stats.propagation_time += stats.propagation_time
+        if stats.gave_up and stats.gave_up != solver.CANCELLED:
+            self.stats.gave_up = stats.gave_up
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve one puzzle, given in the batch solver's line format, on several cores.")
+    parser.add_argument('puzzle', help="the puzzle line")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--split', type=int, default=4, help="subtrees per worker")
+    parser.add_argument('--count', type=int, default=None, help="count solutions up to this many instead of solving")
+    parser.add_argument('--backend', choices=['bitmask', 'dlx'], default='bitmask', help="solver backend")
+    parser.add_argument('--propagation', choices=['singles', 'advanced'], default='singles', help="propagation tier")
+    args = parser.parse_args(argv)
+
+    puzzle = ParallelSolver(utils.board_from_line(args.puzzle), workers=args.workers, split=args.split,
+                            backend=args.backend, propagation=args.propagation)
+    if args.count:
+        print("%s solution(s)" % puzzle.count_solutions(args.count))
+    else:
+        solution = puzzle.solve()
+        if solution is None:
+            print("gave up (%s)" % puzzle.stats.gave_up)
+        else:
+            print("no solution" if solution is False else utils.line_from_board(solution))
+    print(puzzle.stats)
+
+
+if __name__=='__main__':
+    main()
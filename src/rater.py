@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+import argparse
+import collections
+import functools
+import math
+import sys
+import numpy as np
+try:
+    import src.batchsolver as batchsolver
+    import src.sudokusolver as solver
+    import src.techniques as techniques
+    import src.utils as utils
+except ModuleNotFoundError:
+    import batchsolver
+    import sudokusolver as solver
+    import techniques
+    import utils
+
+
+# human techniques from easiest to hardest, rated on the usual Sudoku Explainer scale
+RATINGS = (
+    ('hidden_single', 1.5, techniques.hidden_singles),
+    ('naked_single', 2.3, techniques.naked_singles),
+    ('pointing', 2.6, techniques.pointing),
+    ('box_line_reduction', 2.8, techniques.box_line_reduction),
+    ('naked_pair', 3.0, functools.partial(techniques.naked_subsets, size=2)),
+    ('x_wing', 3.2, functools.partial(techniques.fish, size=2)),
+    ('hidden_pair', 3.4, functools.partial(techniques.hidden_subsets, size=2)),
+    ('naked_triple', 3.6, functools.partial(techniques.naked_subsets, size=3)),
+    ('swordfish', 3.8, functools.partial(techniques.fish, size=3)),
+    ('hidden_triple', 4.0, functools.partial(techniques.hidden_subsets, size=3)),
+    ('naked_quad', 5.0, functools.partial(techniques.naked_subsets, size=4)),
+    ('jellyfish', 5.2, functools.partial(techniques.fish, size=4)),
+    ('hidden_quad', 5.4, functools.partial(techniques.hidden_subsets, size=4)),
+)
+# what a puzzle needing none of the above gets: trial and error
+BACKTRACKING = 'backtracking'
+BACKTRACKING_RATING = 10.0
+
+# score is the rating of the hardest technique needed, None for an invalid board;
+# steps counts the applications of every technique
+Rating = collections.namedtuple('Rating', ['score', 'hardest', 'steps', 'solved'])
+
+
+class Rater():
+
+    def __init__(self, problem):
+        self.problem = np.array(problem)
+        self.tables = solver.get_tables(math.isqrt(self.problem.shape[0]))
+        tables = self.tables
+        values = [int(v) for v in self.problem.flatten()]
+        # candidates as in SudokuSolver, with the givens already ruled out of their units:
+        # writing down a digit is free, noticing where it goes is the technique
+        placed = [0] * len(tables.units)
+        for u, unit in enumerate(tables.units):
+            for x in unit:
+                if values[x] > 0:
+                    placed[u] |= 1 << (values[x] - 1)
+        self.domains = []
+        for x, val in enumerate(values):
+            if val > 0:
+                self.domains.append(1 << (val - 1))
+            else:
+                self.domains.append(tables.all_digits & ~techniques.union(placed, tables.cell_unit_ids[x]))
+        self.steps = collections.Counter()
+
+    def rate(self):
+        # applies the easiest technique that makes progress, all of its findings at once,
+        # then starts over from the easiest, until the board is solved or nothing applies
+        hardest, score = None, 0.
+        if not self.consistent():
+            return Rating(None, None, self.steps, False)
+        while not self.solved():
+            for name, rating, technique in RATINGS:
+                applied = self.apply(name, technique)
+                if applied is None:
+                    return Rating(None, None, self.steps, False)
+                if applied:
+                    if rating > score:
+                        hardest, score = name, rating
+                    break
+            else:
+                return Rating(BACKTRACKING_RATING, BACKTRACKING, self.steps, False)
+        if not self.consistent():
+            return Rating(None, None, self.steps, False)
+        return Rating(score, hardest, self.steps, True)
+
+    def apply(self, name, technique):
+        # how many findings made progress, or None on a contradiction
+        domains, applied = self.domains, 0
+        for cells, mask in list(technique(domains, self.tables)):
+            progress = False
+            for x in cells:
+                if domains[x] & mask:
+                    domains[x] &= ~mask
+                    progress = True
+                    if not domains[x]:
+                        return None
+                    # a hidden single is found and written down in one go
+                    if name == 'hidden_single' and not self.place(x):
+                        return None
+            applied += progress
+        self.steps[name] += applied
+        return applied
+
+    def place(self, x):
+        domains = self.domains
+        for y in self.tables.peers[x]:
+            domains[y] &= ~domains[x]
+            if not domains[y]:
+                return False
+        return True
+
+    def consistent(self):
+        domains = self.domains
+        for unit in self.tables.units:
+            if techniques.union(domains, unit) != self.tables.all_digits:
+                return False
+            for x in unit:
+                if self.tables.popcount(domains[x]) == 1:
+                    if any(domains[y] == domains[x] for y in self.tables.peers[x]):
+                        return False
+        return True
+
+    def solved(self):
+        popcount = self.tables.popcount
+        return all(popcount(mask) == 1 for mask in self.domains)
+
+
+def rate_line(line):
+    try:
+        board = utils.board_from_line(line)
+    except ValueError:
+        return '%s\t%s' % (line, batchsolver.INVALID)
+    rating = Rater(board).rate()
+    if rating.score is None:
+        return '%s\t%s' % (line, batchsolver.INVALID)
+    return '%s\t%.1f\t%s' % (line, rating.score, rating.hardest)
+
+def rate_chunk(lines):
+    return [rate_line(line) for line in lines]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rate puzzles, given one per line as for the batch solver, by the human techniques "
+                                     "they need. Prints each puzzle with its score and hardest technique, tab separated.")
+    parser.add_argument('input', nargs='?', default='-', help="puzzle file, or - for stdin (default)")
+    parser.add_argument('-o', '--output', default='-', help="rating file, or - for stdout (default)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('-c', '--chunksize', type=int, default=64, help="puzzles sent to a worker at a time")
+    args = parser.parse_args(argv)
+
+    infile = sys.stdin if args.input == '-' else open(args.input)
+    outfile = sys.stdout if args.output == '-' else open(args.output, 'w')
+    batch = batchsolver.BatchSolver(workers=args.workers, chunksize=args.chunksize)
+    try:
+        for result in batch.map(rate_chunk, batchsolver.read_puzzles(infile)):
+            outfile.write(result + '\n')
+    finally:
+        if infile is not sys.stdin:
+            infile.close()
+        if outfile is not sys.stdout:
+            outfile.close()
+    print(batch.summary('Rated'), file=sys.stderr)
+
+
+if __name__=='__main__':
+    main()
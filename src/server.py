@@ -0,0 +1,283 @@
+#!/usr/bin/python3
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import socket
+import sys
+import numpy as np
+try:
+    import src.sudokusolver as solver
+    import src.utils as utils
+except ModuleNotFoundError:
+    import sudokusolver as solver
+    import utils
+
+
+# JSON lines in both directions. A request is
+#     {"id": any, "op": "solve" | "count" | "validate", "puzzle": line or list of rows,
+#      "limit": for count (default 2), "options": SudokuSolver options}
+# and every response echoes its id, in completion order rather than request order:
+#     {"id": ..., "status": ..., "solution": line, "count": n, "stats": {...}}
+# or {"id": ..., "error": message} for a request that can't be handled.
+OPS = ('solve', 'count', 'validate')
+
+# validate statuses; a puzzle is valid if it has exactly one solution
+UNIQUE = 'unique'
+MULTIPLE = 'multiple'
+INVALID = 'invalid'
+
+# solver options a request may set; the server's own limits cap the ones it asks for
+REQUEST_OPTIONS = ('strategy', 'backend', 'propagation', 'timeout', 'max_nodes')
+LIMIT_OPTIONS = ('timeout', 'max_nodes')
+
+
+def parse_puzzle(puzzle):
+    if isinstance(puzzle, str):
+        return utils.board_from_line(puzzle)
+    # rows of digits, 0 or -1 for blank, on a board of the sizes a line can hold
+    if not isinstance(puzzle, list) or not all(isinstance(row, list) for row in puzzle):
+        raise ValueError("Expected a puzzle line or a list of rows")
+    if not all(type(v) is int for row in puzzle for v in row):
+        raise ValueError("Expected whole numbers in every row")
+    board = np.array(puzzle)
+    size = board.shape[0] if board.ndim == 2 else 0
+    box = math.isqrt(size)
+    if board.shape != (size, size) or not size or box * box != size or size > len(utils.LINE_SYMBOLS):
+        raise ValueError("Expected 9, 16 or 25 rows of as many digits, got shape %s" % (board.shape,))
+    if board.min() < -1 or board.max() > size:
+        raise ValueError("Expected digits from 1 to %d, 0 or -1" % size)
+    return board
+
+def parse_limit(key, value, default):
+    # a positive number, no larger than the server's own limit if it has one
+    if type(value) not in (int, float) or (key == 'max_nodes' and type(value) is not int) or not value > 0:
+        raise ValueError("Expected a positive %s for %r, got %r" % (
+            "whole number" if key == 'max_nodes' else "number of seconds", key, value))
+    return value if default is None else min(value, default)
+
+def parse_count_limit(limit):
+    if type(limit) is not int or limit < 1:
+        raise ValueError("Expected a whole number of at least 1 for 'limit', got %r" % (limit,))
+    return limit
+
+def handle_request(request, defaults):
+    response = {'id': request.get('id')}
+    try:
+        op = request.get('op', 'solve')
+        if op not in OPS:
+            raise ValueError("Unknown op %r" % op)
+        options = dict(defaults)
+        for key, value in (request.get('options') or {}).items():
+            if key not in REQUEST_OPTIONS:
+                raise ValueError("Unknown option %r" % key)
+            options[key] = parse_limit(key, value, defaults.get(key)) if key in LIMIT_OPTIONS else value
+        if 'puzzle' not in request:
+            raise ValueError("Missing puzzle")
+        board = parse_puzzle(request['puzzle'])
+        puzzle = solver.Solver(**options)
+        if op == 'solve':
+            result = puzzle.solve(board)
+        else:
+            found, result = puzzle.count_solutions(board, 2 if op == 'validate' else parse_count_limit(request.get('limit', 2)))
+            response['count'] = found
+    except (TypeError, ValueError) as error:
+        if request.get('op') == 'validate':
+            response.update(status=INVALID, valid=False, reason=str(error))
+        else:
+            response['error'] = str(error)
+        return response
+    response['status'] = result.status
+    if op == 'validate' and result.status == solver.SOLVED:
+        response['status'] = UNIQUE if found == 1 else MULTIPLE
+        response['valid'] = found == 1
+    elif op == 'validate':
+        response['valid'] = False
+    if result.grid is not None:
+        response['solution'] = utils.line_from_board(result.grid)
+    response['stats'] = result.stats.as_dict()
+    return response
+
+def handle_batch(requests, defaults):
+    # requests from different clients share a batch, so one that fails in a way
+    # handle_request doesn't foresee only fails its own response
+    responses = []
+    for request in requests:
+        try:
+            responses.append(handle_request(request, defaults))
+        except Exception as error:
+            responses.append({'id': request.get('id'), 'error': "Failed: %s: %s" % (type(error).__name__, error)})
+    return responses
+
+
+class SolveServer():
+
+    def __init__(self, host='127.0.0.1', port=8765, path=None, workers=None, batch_size=32, batch_delay=0.002,
+                 backlog=1024, **defaults):
+        self.host = host
+        self.port = port
+        # serve on this unix socket instead of host/port
+        self.path = path
+        self.workers = workers or os.cpu_count() or 1
+        # requests sent to a worker at once, and how long a partial batch waits for more
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        # requests queued before the server stops reading sockets, which pushes back on clients
+        self.backlog = backlog
+        # solver options for every request, e.g. a timeout that keeps one puzzle from holding a worker
+        self.defaults = defaults
+        self.pool = None
+        self.server = None
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.backlog)
+        # batches in flight; more would only wait in the pool's own queue
+        self.slots = asyncio.Semaphore(self.workers * 2)
+        self.pool = multiprocessing.Pool(self.workers)
+        self.dispatcher = asyncio.ensure_future(self.dispatch())
+        if self.path:
+            self.server = await asyncio.start_unix_server(self.handle_connection, self.path)
+        else:
+            self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+            self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.dispatcher.cancel()
+        self.pool.terminate()
+
+    async def handle_connection(self, reader, writer):
+        lock = asyncio.Lock()
+        # replies still waiting on their response; done ones drop out, so a long-lived
+        # connection holds no more than what's in flight
+        replies = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("Expected a JSON object")
+                except ValueError as error:
+                    await self.respond(writer, lock, {'id': None, 'error': "Bad request: %s" % error})
+                    continue
+                future = asyncio.get_running_loop().create_future()
+                task = asyncio.ensure_future(self.reply(writer, lock, future))
+                replies.add(task)
+                task.add_done_callback(replies.discard)
+                await self.queue.put((request, future))
+            await asyncio.gather(*replies)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def reply(self, writer, lock, future):
+        await self.respond(writer, lock, await future)
+
+    async def respond(self, writer, lock, response):
+        async with lock:
+            if not writer.is_closing():
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+
+    async def dispatch(self):
+        # takes what is queued, up to batch_size requests or batch_delay seconds, per batch
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.batch_delay
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self.slots.acquire()
+            asyncio.ensure_future(self.run_batch(batch))
+
+    async def run_batch(self, batch):
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        try:
+            requests = [request for request, future in batch]
+            self.pool.apply_async(
+                handle_batch, (requests, self.defaults),
+                callback=lambda result: loop.call_soon_threadsafe(done.set_result, result),
+                error_callback=lambda error: loop.call_soon_threadsafe(done.set_exception, error),
+            )
+            try:
+                responses = await done
+            except Exception as error:
+                responses = [{'id': request.get('id'), 'error': "Worker failed: %s" % error} for request in requests]
+            for (request, future), response in zip(batch, responses):
+                future.set_result(response)
+        finally:
+            self.slots.release()
+
+
+def request(requests, host='127.0.0.1', port=8765, path=None):
+    # blocking client: sends every request and returns the responses, in request order
+    if path:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host, port))
+    requests = [dict(request, id=request.get('id', i)) for i, request in enumerate(requests)]
+    with sock, sock.makefile('rw') as f:
+        for line in requests:
+            f.write(json.dumps(line) + '\n')
+        f.flush()
+        sock.shutdown(socket.SHUT_WR)
+        responses = {}
+        for line in f:
+            response = json.loads(line)
+            responses[response['id']] = response
+    return [responses.get(request['id']) for request in requests]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve solve, count and validate requests as JSON lines over a local socket.")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on (default: localhost only)")
+    parser.add_argument('--port', type=int, default=8765, help="port to listen on")
+    parser.add_argument('--unix', default=None, help="listen on this unix socket instead")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="worker processes (default: one per CPU)")
+    parser.add_argument('--batch-size', type=int, default=32, help="requests sent to a worker at a time")
+    parser.add_argument('--backlog', type=int, default=1024, help="queued requests before clients are made to wait")
+    parser.add_argument('--timeout', type=float, default=10., help="default seconds allowed per puzzle")
+    parser.add_argument('--max-nodes', type=int, default=None, help="default search nodes allowed per puzzle")
+    args = parser.parse_args(argv)
+
+    server = SolveServer(args.host, args.port, path=args.unix, workers=args.workers, batch_size=args.batch_size,
+                         backlog=args.backlog, timeout=args.timeout, max_nodes=args.max_nodes)
+
+    async def serve():
+        await server.start()
+        print("Serving on %s" % (server.path or "%s:%d" % (server.host, server.port)), file=sys.stderr)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__=='__main__':
+    main()
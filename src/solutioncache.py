@@ -0,0 +1,160 @@
+#!/usr/bin/python3
+import collections
+import itertools
+import math
+import shelve
+import numpy as np
+try:
+    import src.sudokusolver as solver
+    import src.utils as utils
+except ModuleNotFoundError:
+    import sudokusolver as solver
+    import utils
+
+
+# orderings tried per board before settling for a key that may not be canonical; equivalent
+# boards then just miss each other, the cached solutions stay correct
+MAX_CANDIDATES = 1024
+
+
+# A transform is (transpose, row order, column order, digit map): the board is transposed
+# if asked, then row i of the result is row `rows[i]` of that, likewise for columns, and
+# every digit d becomes digits[d]. Any sequence of band/stack swaps, row/column swaps
+# within them, transposition and relabeling is one of these.
+
+def invert_transform(board, transform):
+    transpose, rows, cols, digits = transform
+    inverse = np.zeros_like(digits)
+    inverse[digits] = np.arange(len(digits))
+    grid = np.empty_like(board)
+    grid[np.ix_(rows, cols)] = inverse[board]
+    return grid.T if transpose else grid
+
+def relabel(grid, size):
+    # digits in order of first appearance; index 0 holds blanks (any value <= 0)
+    digits = np.zeros(size + 1, dtype=int)
+    label = 0
+    for d in grid.flatten():
+        if d > 0 and not digits[d]:
+            label += 1
+            digits[d] = label
+    for d in range(1, size + 1):
+        if not digits[d]:
+            label += 1
+            digits[d] = label
+    return digits
+
+def line_orders(keys, box):
+    # every order of the lines (rows or columns) that sorts groups of `box` (bands or
+    # stacks) by their sorted line keys and the lines of each group by key; ties are
+    # enumerated, since any of them may give the smallest board
+    groups = [sorted(range(g * box, (g + 1) * box), key=keys.__getitem__) for g in range(box)]
+    group_keys = [tuple(keys[i] for i in group) for group in groups]
+    group_orders = tied_permutations(range(box), group_keys)
+    orders = [tied_permutations(group, [keys[i] for i in group]) for group in groups]
+    for order in group_orders:
+        for lines in itertools.product(*(orders[g] for g in order)):
+            yield [i for group in lines for i in group]
+
+def tied_permutations(items, keys):
+    # permutations of `items` sorted by `keys`, in every order of the runs of equal keys
+    items = sorted(zip(keys, items), key=lambda item: item[0])
+    runs = [[item for _, item in run] for _, run in itertools.groupby(items, key=lambda item: item[0])]
+    return [
+        [item for run in perm for item in run]
+        for perm in itertools.product(*(itertools.permutations(run) for run in runs))
+    ]
+
+def candidate_transforms(board):
+    # orderings keyed on properties that no symmetry changes: the number of givens on a line,
+    # and how many givens the crossing lines hold where it has its own
+    size = board.shape[0]
+    box = math.isqrt(size)
+    given = board > 0
+    for transpose in (False, True):
+        grid = given.T if transpose else given
+        row_counts, col_counts = grid.sum(axis=1), grid.sum(axis=0)
+        row_keys = [(row_counts[r], tuple(sorted(col_counts[grid[r]]))) for r in range(size)]
+        col_keys = [(col_counts[c], tuple(sorted(row_counts[grid[:, c]]))) for c in range(size)]
+        for rows in line_orders(row_keys, box):
+            for cols in line_orders(col_keys, box):
+                yield transpose, rows, cols
+
+def canonicalize(board):
+    # (key, transform) where key is the smallest line format of the board over the candidate
+    # transforms, so boards that are the same puzzle up to symmetry share a key
+    board = np.where(np.asarray(board) > 0, board, 0)
+    size = board.shape[0]
+    best = None
+    for transpose, rows, cols in itertools.islice(candidate_transforms(board), MAX_CANDIDATES):
+        grid = (board.T if transpose else board)[np.ix_(rows, cols)]
+        digits = relabel(grid, size)
+        key = utils.line_from_board(digits[grid])
+        if best is None or key < best[0]:
+            best = key, (transpose, rows, cols, digits)
+    return best
+
+
+class SolutionCache():
+
+    def __init__(self, maxsize=4096, path=None, **options):
+        self.maxsize = maxsize
+        # keyword arguments for the SudokuSolver run on a miss
+        self.options = options
+        # canonical key -> canonical solution line, or None if there is no solution
+        self.entries = collections.OrderedDict()
+        # shelve file backing the in-memory entries across restarts
+        self.store = shelve.open(path) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    def solve(self, problem):
+        # a solution, False or None, like SudokuSolver(problem, **options).solve(render=False);
+        # puzzles with several solutions may get a different one than a fresh solve would find.
+        # Solves that gave up on a limit are not cached
+        problem = np.array(problem)
+        key, transform = canonicalize(problem)
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            solution = self.entries[key]
+            self.hits += 1
+        elif self.store is not None and key in self.store:
+            solution = self.store[key]
+            self.remember(key, solution)
+            self.hits += 1
+        else:
+            self.misses += 1
+            solution = solver.SudokuSolver(utils.board_from_line(key), **self.options).solve(render=False)
+            if solution is None:
+                return None
+            if solution is not False:
+                solution = utils.line_from_board(solution)
+            else:
+                solution = None
+            self.remember(key, solution)
+            if self.store is not None:
+                self.store[key] = solution
+        if solution is None:
+            return False
+        return invert_transform(utils.board_from_line(solution), transform)
+
+    def remember(self, key, solution):
+        self.entries[key] = solution
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def summary(self):
+        total = self.hits + self.misses
+        return "%d hits, %d misses (%.0f%% hit rate), %d cached" % (
+            self.hits, self.misses, 100. * self.hits / total if total else 0., len(self.entries))
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
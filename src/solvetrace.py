@@ -0,0 +1,174 @@
+#!/usr/bin/python3
+import argparse
+import array
+import collections
+import numpy as np
+try:
+    import src.sudokusolver as solver
+    import src.utils as utils
+except ModuleNotFoundError:
+    import sudokusolver as solver
+    import utils
+
+
+# entry kinds: a cell set to a digit, a digit ruled out of a cell, and the search leaving
+# the node at some depth, which undoes every assignment made at that depth or below
+ASSIGN = 0
+ELIMINATE = 1
+BACKTRACK = 2
+KINDS = ('assign', 'eliminate', 'backtrack')
+
+# entries kept per trace; past this a solve stops recording and marks its trace truncated
+MAX_ENTRIES = 1 << 24
+
+# entries between the states TracePlayer keeps, so seeking backwards never replays far
+CHECKPOINT_INTERVAL = 4096
+
+
+# An entry is one int32: depth, cell, digit and kind, packed from the top down in 14, 10,
+# 5 and 2 bits, which covers every board up to 25x25
+def encode(kind, x, val, depth):
+    return ((depth << 10 | x) << 5 | val) << 2 | kind
+
+def decode(entry):
+    # (kind, cell, digit, depth)
+    return entry & 3, entry >> 7 & 1023, entry >> 2 & 31, entry >> 17
+
+
+class SolveTrace():
+
+    def __init__(self, initial, entries=None, truncated=False, limit=MAX_ENTRIES):
+        # the board when recording started, with every cell already decided filled in
+        # and 0 for the rest
+        self.initial = np.array(initial)
+        self.size = self.initial.shape[0]
+        self.entries = array.array('i', entries if entries is not None else ())
+        self.truncated = truncated
+        self.limit = limit
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, i):
+        return decode(self.entries[i])
+
+    def columns(self):
+        # kind, cell, digit and depth of every entry, as numpy arrays
+        entries = np.frombuffer(self.entries, dtype=np.int32) if self.entries else np.zeros(0, dtype=np.int32)
+        return entries & 3, entries >> 7 & 1023, entries >> 2 & 31, entries >> 17
+
+    def counts(self):
+        kinds = self.columns()[0]
+        return {name: int(np.sum(kinds == kind)) for kind, name in enumerate(KINDS)}
+
+    def summary(self, top=5):
+        kinds, cells, digits, depths = self.columns()
+        counts = self.counts()
+        text = "%d entries%s: %d assignments, %d eliminations, %d backtracks, max depth %d" % (
+            len(self), " (truncated)" if self.truncated else "", counts['assign'], counts['eliminate'],
+            counts['backtrack'], int(depths.max()) if len(depths) else 0)
+        # the cells the search kept coming back to
+        busiest = collections.Counter(cells[kinds == ASSIGN].tolist()).most_common(top)
+        if busiest:
+            text += "\nmost assigned cells: " + ', '.join(
+                "r%dc%d x%d" % (x // self.size + 1, x % self.size + 1, n) for x, n in busiest)
+        return text
+
+    def save(self, path):
+        np.savez_compressed(path, initial=self.initial, entries=np.frombuffer(self.entries, dtype=np.int32),
+                            truncated=self.truncated)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data['initial'], data['entries'].tolist(), bool(data['truncated']))
+
+
+# Replays a trace onto the board it shows at each entry; the board is a flat list of
+# digits, 0 for blank, and position is the number of entries applied
+class TracePlayer():
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.board = [int(v) for v in trace.initial.flatten()]
+        # (depth, cell, previous digit) of every assignment not yet undone
+        self.undo = []
+        self.position = 0
+        self.checkpoints = [(list(self.board), [])]
+
+    def seek(self, position):
+        # moves to `position`, clamped to the entries recorded so far, and returns the
+        # cells whose digit changed as (cell, digit) pairs
+        position = max(0, min(position, len(self.trace)))
+        before = list(self.board)
+        if position < self.position:
+            checkpoint = min(position // CHECKPOINT_INTERVAL, len(self.checkpoints) - 1)
+            board, undo = self.checkpoints[checkpoint]
+            self.board, self.undo = list(board), list(undo)
+            self.position = checkpoint * CHECKPOINT_INTERVAL
+        self.replay(position)
+        return [(x, val) for x, (old, val) in enumerate(zip(before, self.board)) if old != val]
+
+    def step(self, count=1):
+        return self.seek(self.position + count)
+
+    def replay(self, position):
+        # eliminations don't change the board, so only the other entries are walked; the
+        # slice is a copy, leaving the buffer free to grow while a solve is still recording
+        board, undo, start = self.board, self.undo, self.position
+        entries = np.frombuffer(self.trace.entries[start:position], dtype=np.int32)
+        moves = np.flatnonzero(entries & 3 != ELIMINATE)
+        entries = entries[moves]
+        next_checkpoint = len(self.checkpoints) * CHECKPOINT_INTERVAL
+        for i, kind, x, val, depth in zip((moves + start).tolist(), (entries & 3).tolist(), (entries >> 7 & 1023).tolist(),
+                                          (entries >> 2 & 31).tolist(), (entries >> 17).tolist()):
+            while i >= next_checkpoint:
+                self.checkpoints.append((list(board), list(undo)))
+                next_checkpoint += CHECKPOINT_INTERVAL
+            if kind == ASSIGN:
+                undo.append((depth, x, board[x]))
+                board[x] = val
+            else:
+                while undo and undo[-1][0] >= depth:
+                    _, y, previous = undo.pop()
+                    board[y] = previous
+        while position >= next_checkpoint:
+            self.checkpoints.append((list(board), list(undo)))
+            next_checkpoint += CHECKPOINT_INTERVAL
+        self.position = position
+
+    @property
+    def finished(self):
+        return self.position == len(self.trace)
+
+    def grid(self):
+        return np.array(self.board).reshape((self.trace.size, self.trace.size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record the trace of a solve, or summarise a saved one.")
+    parser.add_argument('puzzle', nargs='?', default=None, help="the puzzle line to solve")
+    parser.add_argument('--load', default=None, help="summarise this saved trace instead")
+    parser.add_argument('-o', '--output', default=None, help="save the trace here (.npz)")
+    parser.add_argument('--strategy', choices=['copy', 'trail', 'backjump'], default='copy', help="search strategy")
+    parser.add_argument('--backend', choices=['bitmask', 'dlx'], default='bitmask', help="solver backend")
+    parser.add_argument('--propagation', choices=['singles', 'advanced'], default='singles', help="propagation tier")
+    args = parser.parse_args(argv)
+    if (args.puzzle is None) == (args.load is None):
+        parser.error("give either a puzzle or --load")
+
+    if args.load:
+        trace = SolveTrace.load(args.load)
+    else:
+        puzzle = solver.SudokuSolver(utils.board_from_line(args.puzzle), strategy=args.strategy, backend=args.backend,
+                                     propagation=args.propagation, trace=True)
+        puzzle.solve(render=False)
+        trace = puzzle.trace
+        print(puzzle.stats)
+    print(trace.summary())
+    if args.output:
+        trace.save(args.output)
+
+
+if __name__=='__main__':
+    main()
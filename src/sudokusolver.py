@@ -1,140 +1,751 @@
 #!/usr/bin/python3
-import copy
+import collections
+import functools
+import itertools
+import math
+import threading
+import time
 import numpy as np
 try:
-    import src.constants as constants
+    import src.dlx as dlx
+    import src.solvetrace as solvetrace
+    import src.techniques as techniques
     import src.utils as utils
 except ModuleNotFoundError:
-    import constants
+    import dlx
+    import solvetrace
+    import techniques
     import utils
 
 
+BoardTables = collections.namedtuple('BoardTables', [
+    'box', 'size', 'all_digits', 'popcount', 'cells', 'units', 'cell_units', 'peers', 'cell_unit_ids',
+    'intersections',
+])
+
+
+def build_units(box):
+    size = box * box
+    rows = [tuple(row * size + col for col in range(size)) for row in range(size)]
+    cols = [tuple(row * size + col for row in range(size)) for col in range(size)]
+    blocks = [[] for _ in range(size)]
+    for row in range(size):
+        for col in range(size):
+            blocks[utils.idx_to_blockno(row, col, box)].append(row * size + col)
+    return tuple(rows + cols + [tuple(block) for block in blocks])
+
+@functools.lru_cache(maxsize=None)
+def get_tables(box):
+    # flat cell indices (row * size + col) and the units and peers of every cell, built once
+    # per block size and shared by every solver. Candidates are stored as bitmasks: bit
+    # (d - 1) is set when digit d is possible.
+    size = box * box
+    all_digits = (1 << size) - 1
+    if size <= 16:
+        popcount = tuple(bin(mask).count('1') for mask in range(all_digits + 1)).__getitem__
+    else:
+        popcount = getattr(int, 'bit_count', lambda mask: bin(mask).count('1'))
+    cells = range(size * size)
+    units = build_units(box)
+    cell_units, cell_unit_ids = [[] for x in cells], [[] for x in cells]
+    for u, unit in enumerate(units):
+        for x in unit:
+            cell_units[x].append(unit)
+            cell_unit_ids[x].append(u)
+    peers = tuple(tuple(sorted(set().union(*cell_units[x]) - {x})) for x in cells)
+    # (shared cells, rest of block, rest of line) for every block crossing a row or column
+    intersections = []
+    for block in units[2 * size:]:
+        for line in units[:2 * size]:
+            shared = tuple(x for x in block if x in line)
+            if shared:
+                intersections.append((
+                    shared, tuple(x for x in block if x not in shared), tuple(x for x in line if x not in shared),
+                ))
+    return BoardTables(
+        box, size, all_digits, popcount, cells, units,
+        tuple(map(tuple, cell_units)), peers, tuple(map(tuple, cell_unit_ids)), tuple(intersections),
+    )
+
+
+TABLES = get_tables(3)
+
+# learned nogoods kept by the backjumping search, least recently used dropped first
+NOGOOD_LIMIT = 256
+
+# reasons a solve can give up, left in SolveStats.gave_up
+TIMEOUT = 'timeout'
+NODE_BUDGET = 'node budget'
+CANCELLED = 'cancelled'
+
+
+class CancellationToken():
+    # shared with a solver and cancelled from any thread; the search notices at its next node.
+    # Wrapping a multiprocessing Event instead shares it with worker processes
+
+    def __init__(self, event=None):
+        self.event = event if event is not None else threading.Event()
+
+    def cancel(self):
+        self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class GaveUp(Exception):
+    pass
+
+
+class SolveStats():
+
+    def __init__(self):
+        self.nodes = 0
+        # search nodes that failed, either by contradiction or by running out of values
+        self.backtracks = 0
+        self.max_depth = 0
+        self.assignments = 0
+        self.eliminations = 0
+        # applications of each technique of the advanced propagation tier
+        self.techniques = collections.Counter()
+        self.propagation_time = 0.
+        self.time = 0.
+        self.solutions = 0
+        # backjumping search only: failures that skipped levels, and branches cut by nogoods
+        self.backjumps = 0
+        self.nogood_prunes = 0
+        # TIMEOUT, NODE_BUDGET or CANCELLED when the solve stopped early; the rest is partial
+        self.gave_up = None
+
+    @property
+    def branching_time(self):
+        return self.time - self.propagation_time
+
+    def as_dict(self):
+        return {
+            'nodes': self.nodes,
+            'backtracks': self.backtracks,
+            'max_depth': self.max_depth,
+            'assignments': self.assignments,
+            'eliminations': self.eliminations,
+            'techniques': dict(self.techniques),
+            'propagation_time': self.propagation_time,
+            'branching_time': self.branching_time,
+            'time': self.time,
+            'solutions': self.solutions,
+            'backjumps': self.backjumps,
+            'nogood_prunes': self.nogood_prunes,
+            'gave_up': self.gave_up,
+        }
+
+    def __repr__(self):
+        return "SolveStats(%s)" % ', '.join('%s=%r' % item for item in self.as_dict().items())
+
+
+def check_options(strategy, backend, propagation):
+    if strategy not in ('copy', 'trail', 'backjump'):
+        raise ValueError("Unknown search strategy %r" % strategy)
+    if backend not in ('bitmask', 'dlx'):
+        raise ValueError("Unknown solver backend %r" % backend)
+    if propagation not in ('singles', 'advanced'):
+        raise ValueError("Unknown propagation tier %r" % propagation)
+
+
 class SudokuSolver():
 
-    def __init__(self, problem, renderer=None):
+    def __init__(self, problem, renderer=None, strategy='copy', backend='bitmask', propagation='singles',
+                 stats_hook=None, timeout=None, max_nodes=None, token=None, trace=False):
+        check_options(strategy, backend, propagation)
         self.problem = np.array(problem)
+        self.size = self.problem.shape[0]
+        box = math.isqrt(self.size)
+        if self.problem.shape != (self.size, self.size) or box * box != self.size:
+            raise ValueError("Expected a square board with square blocks, got shape %s" % (self.problem.shape,))
         self.renderer = renderer
-        self.rows   = self.rows_from_numpy(self.problem)
-        self.cols   = self.cols_from_numpy(self.problem)
-        self.blocks = self.blocks_from_numpy(self.problem)
-        self.iter = 0
+        self.strategy = strategy
+        self.backend = backend
+        self.propagation = propagation
+        # called with the SolveStats of every solve, count or enumeration once it finishes
+        self.stats_hook = stats_hook
+        # limits of every solve, count or enumeration: seconds, search nodes, and a
+        # CancellationToken; when one is hit the solve returns None and sets stats.gave_up
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.token = token
+        self.limited = False
+        self.deadline = None
+        self.stats = SolveStats()
         self.render = False
+        self.trail = None
+        # with trace=True every solve, count or enumeration records a SolveTrace of its
+        # assignments, eliminations and backtracks, left in self.trace; trace_buffer is its
+        # array while recording, and trace_depth the depth entries are recorded at
+        self.tracing = trace
+        self.trace = None
+        self.trace_buffer = None
+        self.trace_depth = 0
+
+        tables = get_tables(box)
+        self.tables = tables
+        self.variables = tables.cells
+        self.peers = tables.peers
+        self.cell_units = tables.cell_units
+        self.popcount = tables.popcount
+        self.domains = [tables.all_digits] * len(self.variables)
+        for x in self.variables:
+            val = self.problem[x // self.size][x % self.size]
+            if val > 0 and not self.assign(self.domains, x, int(val)):
+                self.domains = False
+                break
+
+    @property
+    def iter(self):
+        return self.stats.nodes
 
-        self.variables = set([(i, j) for i in range(constants.ROWS) for j in range(constants.COLUMNS)])
-        self.domains = {}
-        for var in self.variables:
-            self.domains[var] = self.assign_domain(*var)
+    @property
+    def techniques(self):
+        return self.stats.techniques
 
     def solve(self, render=True):
+        # the solved board, False if there is no solution, or None if a limit was hit first
         self.render = render
-        self.search(self.domains.copy())
-        if np.min(self.problem) < 0:
-            return False
-        return self.problem
+        self.start_stats()
+        try:
+            if not self.domains:
+                domains = False
+            elif self.backend == 'dlx':
+                domains = next(self.dlx_solutions(self.domains[:]), False)
+            elif self.strategy == 'trail':
+                self.trail = []
+                domains = self.search_trail(self.domains[:])
+            elif self.strategy == 'backjump':
+                self.start_backjump()
+                domains = self.search_backjump(self.domains[:])
+                if isinstance(domains, int):
+                    domains = False
+            else:
+                domains = self.search(self.domains[:])
+        except GaveUp as reason:
+            self.stats.gave_up = str(reason)
+            domains = None
+        finally:
+            self.trail = None
+        self.finish_stats(0 if not domains else 1)
+        if not domains:
+            return domains
+        return self.fill_problem(domains)
+
+    def count_solutions(self, limit=2):
+        # explores until `limit` solutions are found; the first one is left in self.problem,
+        # so count_solutions(2) == 1 both solves the puzzle and proves it well-posed. None
+        # if a limit was hit first; stats.solutions has what was found by then
+        self.render = False
+        self.start_stats()
+        found = 0
+        try:
+            if self.domains:
+                for domains in itertools.islice(self.all_solutions(self.domains[:]), limit):
+                    if not found:
+                        self.fill_problem(domains)
+                    found += 1
+        except GaveUp as reason:
+            self.stats.gave_up = str(reason)
+        self.finish_stats(found)
+        return None if self.stats.gave_up else found
+
+    def iter_solutions(self):
+        # lazily yields every completed grid; the search is suspended between solutions and
+        # only holds one domain list per level of the current branch. Stops early, with
+        # stats.gave_up set, if a limit is hit; the deadline counts time spent between solutions
+        self.render = False
+        self.start_stats()
+        found = 0
+        try:
+            if self.domains:
+                for domains in self.all_solutions(self.domains[:]):
+                    found += 1
+                    yield self.grid(domains)
+        except GaveUp as reason:
+            self.stats.gave_up = str(reason)
+        finally:
+            self.finish_stats(found)
+
+    def start_stats(self):
+        self.stats = SolveStats()
+        self.started = time.perf_counter()
+        self.deadline = None if self.timeout is None else self.started + self.timeout
+        self.limited = self.timeout is not None or self.max_nodes is not None or self.token is not None
+        if self.tracing:
+            initial = [mask.bit_length() if mask and not mask & (mask - 1) else 0 for mask in self.domains or []]
+            self.trace = solvetrace.SolveTrace(np.array(initial).reshape((self.size, self.size)) if initial else
+                                               np.maximum(self.problem, 0))
+            self.trace_buffer = self.trace.entries
+            self.trace_depth = 0
+
+    def check_trace(self):
+        if len(self.trace_buffer) > self.trace.limit:
+            self.trace.truncated = True
+            self.trace_buffer = None
+
+    def trace_backtrack(self, depth):
+        if self.trace_buffer is not None:
+            self.trace_buffer.append(solvetrace.encode(solvetrace.BACKTRACK, 0, 0, depth))
+
+    def check_limits(self, nodes):
+        if self.max_nodes is not None and nodes > self.max_nodes:
+            raise GaveUp(NODE_BUDGET)
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise GaveUp(TIMEOUT)
+        if self.token is not None and self.token.cancelled:
+            raise GaveUp(CANCELLED)
+
+    def finish_stats(self, solutions):
+        self.trace_buffer = None
+        self.stats.solutions = solutions
+        self.stats.time = time.perf_counter() - self.started
+        if callable(self.stats_hook):
+            self.stats_hook(self.stats)
 
     def assign(self, domains, x, val):
         if self.render and callable(self.renderer):
-            self.renderer(*x, val)
-        othervals = domains[x].difference(set([val]))
-        self.problem[x[0]][x[1]] = val
-        if all(self.eliminate(domains, *x, otherval) for otherval in othervals):
+            self.renderer(x // self.size, x % self.size, val)
+        self.stats.assignments += 1
+        othervals = domains[x] & ~(1 << (val - 1))
+        while othervals:
+            bit = othervals & -othervals
+            othervals ^= bit
+            if not self.eliminate(domains, x, bit):
+                return False
+        return domains
+
+    def eliminate(self, domains, x, bit):
+        if not domains[x] & bit:
             return domains
-        else:
+        if self.trail is not None:
+            self.trail.append((x, domains[x]))
+        if self.trace_buffer is not None:
+            self.trace_buffer.append(solvetrace.encode(solvetrace.ELIMINATE, x, bit.bit_length(), self.trace_depth))
+        self.stats.eliminations += 1
+        remaining = domains[x] = domains[x] & ~bit
+        if not remaining:
             return False
+        if not remaining & (remaining - 1):
+            # traced here rather than in assign(), which always ends up here unless it fails
+            if self.trace_buffer is not None:
+                self.trace_buffer.append(solvetrace.encode(solvetrace.ASSIGN, x, remaining.bit_length(), self.trace_depth))
+            for y in self.peers[x]:
+                if not self.eliminate(domains, y, remaining):
+                    return False
+        for block in self.cell_units[x]:
+            place = None
+            for y in block:
+                if domains[y] & bit:
+                    if place is not None:
+                        break
+                    place = y
+            else:
+                if place is None:
+                    return False
+                if domains[place] != bit and not self.assign(domains, place, bit.bit_length()):
+                    return False
+        return domains
 
-    def eliminate(self, domains, row, col, val):
-        x = (row, col)
-        if val not in domains[x]:
+    def search(self, domains, depth=0):
+        if not self.enter(domains, depth):
+            return False
+        x = self.select_variable(domains)
+        if x is None:
             return domains
-        domains[x].remove(val)
-        if not len(domains[x]):
+        # a plain loop rather than a generator, so a level of the search costs one frame
+        # and blank boards up to 25x25 stay inside the recursion limit
+        for val in self.values(domains[x]):
+            result = self.search(self.branch(domains[:], x, val, depth + 1), depth + 1)
+            if result:
+                return result
+        self.stats.backtracks += 1
+        self.trace_backtrack(depth)
+        return False
+
+    def enter(self, domains, depth):
+        stats = self.stats
+        stats.nodes += 1
+        if self.limited:
+            self.check_limits(stats.nodes)
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if self.trace_buffer is not None:
+            self.check_trace()
+        if domains is False or not self.reduce(domains):
+            stats.backtracks += 1
+            self.trace_backtrack(depth)
             return False
-        if len(domains[x]) == 1:
-            lastval = next(iter(domains[x]))
-            if not all(self.eliminate(domains, *y, lastval) for y in self.get_arcs(x)):
-                return False
-        for block in self.get_blocks(x):
-            val_opts = [y for y in block if val in domains[y]]
-            if len(val_opts) == 0:
+        return True
+
+    def branch(self, domains, x, val, depth=0):
+        # depth is that of the node the branch leads to, which its assignments are traced at
+        self.trace_depth = depth
+        start = time.perf_counter()
+        domains = self.assign(domains, x, val)
+        self.stats.propagation_time += time.perf_counter() - start
+        return domains
+
+    def all_solutions(self, domains):
+        if self.backend == 'dlx':
+            return self.dlx_solutions(domains)
+        return self.solutions(domains)
+
+    def solutions(self, domains, depth=0):
+        if not self.enter(domains, depth):
+            return
+        x = self.select_variable(domains)
+        if x is None:
+            self.stats.solutions += 1
+            yield domains
+            self.trace_backtrack(depth)
+            return
+        found = self.stats.solutions
+        for val in self.values(domains[x]):
+            yield from self.solutions(self.branch(domains[:], x, val, depth + 1), depth + 1)
+        if self.stats.solutions == found:
+            self.stats.backtracks += 1
+        self.trace_backtrack(depth)
+
+    def dlx_solutions(self, domains):
+        # exact cover with one column per cell and one per (unit, digit), 324 in all on a 9x9
+        # board; only rows still allowed by the propagated givens are built
+        start = time.perf_counter()
+        consistent = self.reduce(domains)
+        self.stats.propagation_time += time.perf_counter() - start
+        if not consistent:
+            return
+        ndigits = self.size
+        rows = []
+        for x in self.variables:
+            for val in self.values(domains[x]):
+                d = val - 1
+                rows.append((x * ndigits + d, [x] + [len(self.variables) + u * ndigits + d for u in self.tables.cell_unit_ids[x]]))
+        self.matrix = matrix = dlx.DancingLinks(len(self.variables) + len(self.tables.units) * ndigits, rows, callback=self.render_row)
+        try:
+            for solution in matrix.search():
+                for rowid in solution:
+                    x, d = divmod(rowid, ndigits)
+                    domains[x] = 1 << d
+                yield domains
+            self.trace_backtrack(1)
+        finally:
+            self.stats.nodes += matrix.nodes
+            self.stats.backtracks += matrix.backtracks
+            self.stats.max_depth = max(self.stats.max_depth, matrix.max_depth)
+
+    def render_row(self, rowid):
+        self.stats.assignments += 1
+        if self.limited:
+            self.check_limits(self.stats.nodes + self.matrix.nodes)
+        if self.render and callable(self.renderer):
+            x, d = divmod(rowid, self.size)
+            self.renderer(x // self.size, x % self.size, d + 1)
+        if self.trace_buffer is not None:
+            # a row tried no deeper than the last one replaces it and whatever followed
+            depth = len(self.matrix.solution) + 1
+            if depth <= self.trace_depth:
+                self.trace_backtrack(depth)
+            self.trace_depth = depth
+            x, d = divmod(rowid, self.size)
+            self.trace_buffer.append(solvetrace.encode(solvetrace.ASSIGN, x, d + 1, depth))
+            self.check_trace()
+
+    def search_trail(self, domains, depth=0):
+        # same tree as search(), but branches share one domain store and
+        # roll back through the trail instead of working on copies
+        if not self.enter(domains, depth):
+            return False
+        x = self.select_variable(domains)
+        if x is None:
+            return domains
+        for val in self.values(domains[x]):
+            mark = len(self.trail)
+            if self.search_trail(self.branch(domains, x, val, depth + 1), depth + 1):
+                return domains
+            self.undo(domains, mark)
+        self.stats.backtracks += 1
+        self.trace_backtrack(depth)
+        return False
+
+    def undo(self, domains, mark):
+        trail = self.trail
+        while len(trail) > mark:
+            x, mask = trail.pop()
+            domains[x] = mask
+
+    def start_backjump(self):
+        # blame of every elimination, by x * size + digit index: a bitmask of the decision
+        # levels that led to it, where level n is the branch taken at depth n - 1
+        self.blames = [0] * (len(self.variables) * self.size)
+        self.decisions = [None]
+        self.conflict = 0
+        self.nogoods = collections.OrderedDict()
+        self.nogood_index = collections.defaultdict(set)
+
+    def search_backjump(self, domains, depth=0):
+        # conflict-directed backjumping: the solved domains, or the levels to blame for the
+        # failure of this subtree. A branch whose failure doesn't involve its own level fails
+        # the same way for every value, so the search returns straight past it
+        stats = self.stats
+        stats.nodes += 1
+        if self.limited:
+            self.check_limits(stats.nodes)
+        if depth > stats.max_depth:
+            stats.max_depth = depth
+        if self.trace_buffer is not None:
+            self.check_trace()
+        x = self.select_variable(domains)
+        if x is None:
+            return domains
+        level = depth + 1
+        levelbit = 1 << level
+        if len(self.decisions) <= level:
+            self.decisions.append(None)
+        # the values of x already ruled out are part of every failure below
+        blame = self.explain_cell(domains, x)
+        for val in self.values(domains[x]):
+            self.decisions[level] = (x, val)
+            conflict = self.check_nogoods(domains, x, val, levelbit)
+            if conflict is None:
+                child = domains[:]
+                self.trace_depth = depth + 1
+                if self.assign_blamed(child, x, val, levelbit) and self.reduce_blamed(child, (levelbit << 1) - 2):
+                    result = self.search_backjump(child, depth + 1)
+                    if not isinstance(result, int):
+                        return result
+                    conflict = result
+                else:
+                    stats.nodes += 1
+                    stats.backtracks += 1
+                    self.trace_backtrack(depth + 1)
+                    conflict = self.conflict
+            if not conflict & levelbit:
+                stats.backjumps += 1
+                self.trace_backtrack(depth)
+                return conflict
+            blame |= conflict & ~levelbit
+        stats.backtracks += 1
+        self.trace_backtrack(depth)
+        self.learn(blame)
+        return blame
+
+    def reduce_blamed(self, domains, blame):
+        # the advanced tier can't say which decisions its deductions rest on, so they are
+        # blamed on every level so far
+        if self.propagation != 'advanced':
+            return domains
+        start = time.perf_counter()
+        consistent = self.apply_techniques(domains, lambda domains, x, bit: self.eliminate_blamed(domains, x, bit, blame))
+        self.stats.propagation_time += time.perf_counter() - start
+        return consistent
+
+    def assign_blamed(self, domains, x, val, blame):
+        if self.render and callable(self.renderer):
+            self.renderer(x // self.size, x % self.size, val)
+        self.stats.assignments += 1
+        othervals = domains[x] & ~(1 << (val - 1))
+        while othervals:
+            bit = othervals & -othervals
+            othervals ^= bit
+            if not self.eliminate_blamed(domains, x, bit, blame):
                 return False
-            elif len(val_opts) == 1:
-                if not self.assign(domains, val_opts[0], val):
-                    return False
         return domains
 
-    def search(self, domains):
-        self.iter += 1
-        if domains is False:
+    def eliminate_blamed(self, domains, x, bit, blame):
+        # eliminate(), recording the blame of every elimination; on a contradiction the
+        # levels behind it are left in self.conflict
+        if not domains[x] & bit:
+            return domains
+        if self.trace_buffer is not None:
+            self.trace_buffer.append(solvetrace.encode(solvetrace.ELIMINATE, x, bit.bit_length(), self.trace_depth))
+        self.stats.eliminations += 1
+        self.blames[x * self.size + bit.bit_length() - 1] = blame
+        remaining = domains[x] = domains[x] & ~bit
+        if not remaining:
+            self.conflict = self.explain_cell(domains, x)
             return False
-        if all(len(domains[x]) == 1 for x in self.variables):
-            self.assign_singletons(domains)
-            return self.domains
-        k, x = min((len(domains[x]), x) for x in self.variables if len(domains[x]) > 1)
-        return( utils.some(
-            self.search(
-                self.assign(copy.deepcopy(domains), x, val)
-            ) for val in domains[x]
-        ))
-
-    def assign_singletons(self, domains):
+        if not remaining & (remaining - 1):
+            if self.trace_buffer is not None:
+                self.trace_buffer.append(solvetrace.encode(solvetrace.ASSIGN, x, remaining.bit_length(), self.trace_depth))
+            why = self.explain_cell(domains, x)
+            for y in self.peers[x]:
+                if not self.eliminate_blamed(domains, y, remaining, why):
+                    return False
+        d = bit.bit_length() - 1
+        for block in self.cell_units[x]:
+            place = None
+            for y in block:
+                if domains[y] & bit:
+                    if place is not None:
+                        break
+                    place = y
+            else:
+                why = 0
+                for y in block:
+                    if y != place:
+                        why |= self.blames[y * self.size + d]
+                if place is None:
+                    self.conflict = why
+                    return False
+                if domains[place] != bit and not self.assign_blamed(domains, place, d + 1, why):
+                    return False
+        return domains
+
+    def explain_cell(self, domains, x):
+        # the levels behind every value ruled out of x
+        blame = 0
+        base = x * self.size - 1
+        gone = self.tables.all_digits & ~domains[x]
+        while gone:
+            bit = gone & -gone
+            gone ^= bit
+            blame |= self.blames[base + bit.bit_length()]
+        return blame
+
+    def check_nogoods(self, domains, x, val, levelbit):
+        # a learned nogood is a set of (cell, value) decisions that can't all hold; if deciding
+        # x = val completes one, the branch is cut and blamed on the others
+        for nogood in self.nogood_index.get((x, val), ()):
+            for y, w in nogood:
+                if y != x and domains[y] != 1 << (w - 1):
+                    break
+            else:
+                blame = levelbit
+                for y, w in nogood:
+                    if y != x:
+                        blame |= self.explain_cell(domains, y)
+                self.nogoods.move_to_end(nogood)
+                self.stats.nogood_prunes += 1
+                return blame
+        return None
+
+    def learn(self, blame):
+        nogood = []
+        level = 1
+        while blame >> level:
+            if blame >> level & 1:
+                nogood.append(self.decisions[level])
+            level += 1
+        nogood = tuple(sorted(nogood))
+        if not nogood or nogood in self.nogoods:
+            return
+        self.nogoods[nogood] = True
+        for literal in nogood:
+            self.nogood_index[literal].add(nogood)
+        if len(self.nogoods) > NOGOOD_LIMIT:
+            old, _ = self.nogoods.popitem(last=False)
+            for literal in old:
+                self.nogood_index[literal].discard(old)
+
+    def reduce(self, domains):
+        # the advanced tier: pairs, triples, pointing and box/line reduction to a fixpoint,
+        # applied through eliminate() so singles cascade and the trail records everything
+        if self.propagation != 'advanced':
+            return domains
+        start = time.perf_counter()
+        consistent = self.apply_techniques(domains)
+        self.stats.propagation_time += time.perf_counter() - start
+        return consistent
+
+    def apply_techniques(self, domains, eliminate=None):
+        eliminate = eliminate or self.eliminate
+        progress = True
+        while progress:
+            progress = False
+            for name, technique in techniques.TECHNIQUES:
+                for cells, mask in list(technique(domains, self.tables)):
+                    applied = False
+                    for x in cells:
+                        bits = domains[x] & mask
+                        while bits:
+                            bit = bits & -bits
+                            bits ^= bit
+                            applied = True
+                            if not eliminate(domains, x, bit):
+                                return False
+                    if applied:
+                        self.stats.techniques[name] += 1
+                        progress = True
+                if progress:
+                    break
+        return domains
+
+    def select_variable(self, domains):
+        # minimum remaining values; a two-candidate cell can't be beaten
+        popcount = self.popcount
+        best, best_count = None, self.size + 1
         for x in self.variables:
-            if self.problem[x[0]][x[1]] < 0:
-                domains = self.assign(domains, x, next(iter(domains[x])))
-
-    def get_blocks(self, x):
-        row, col = x
-        return [
-            [(x[0], i) for i in range(9)],
-            [(i, x[0]) for i in range(9)],
-            [((row // 3) * 3 + (i // 3), (col // 3) * 3 + (i % 3)) for i in range(9)]
-        ]
-
-    def get_arcs(self, x):
-        row, col = x
-        block = utils.idx_to_blockno(row, col)
-        worklist = set([x])
-        for i in range(9):
-            blocki = ((row // 3) * 3 + (i // 3), (col // 3) * 3 + (i % 3)) 
-            worklist.add((row, i))
-            worklist.add((i, col))
-            worklist.add(blocki)
-        worklist.remove((row, col))
-        return worklist
-
-    ### utility functions ###
-
-    def assign_domain(self, row, col):
-        block = utils.idx_to_blockno(row, col)
-        value = self.problem[row][col]
-        if value != -1:
-            return set([value])
-        domain = set(list(range(1, 10)))
-        domain = domain.difference(self.rows[row])
-        domain = domain.difference(self.cols[col])
-        domain = domain.difference(self.blocks[block])
-        return domain
-
-    def rows_from_numpy(self, board):
-        rows = []
-        for i in range(constants.ROWS):
-            rows += [set(board[i, :])]
-            rows[i].discard(-1)
-        return rows
-
-    def cols_from_numpy(self, board):
-        cols = []
-        for i in range(constants.COLUMNS):
-            cols += [set(board[:, i])]
-            cols[i].discard(-1)
-        return cols
-
-    def blocks_from_numpy(self, board):
-        blocks = [] # ordered 0 1 2 / 3 4 5 / 6 7 8
-        for i in range(constants.BLOCKS):
-            row_lower, col_lower = utils.blockno_to_NW_idx(i)
-            blocks += [set(board[row_lower:row_lower+3, col_lower:col_lower+3].flatten().tolist())]
-            blocks[i].discard(-1)
-        return blocks
+            count = popcount(domains[x])
+            if 1 < count < best_count:
+                best, best_count = x, count
+                if count == 2:
+                    break
+        return best
+
+    def fill_problem(self, domains):
+        for x in self.variables:
+            self.problem[x // self.size][x % self.size] = domains[x].bit_length()
+        return self.problem
+
+    def grid(self, domains):
+        return np.array([mask.bit_length() for mask in domains]).reshape((self.size, self.size))
+
+    def values(self, mask):
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            yield bit.bit_length()
+
+
+SOLVED = 'solved'
+UNSOLVABLE = 'unsolvable'
+GAVE_UP = 'gave up'
+
+# grid is a new solved board, or None unless status is SOLVED; stats belong to this solve only
+SolveResult = collections.namedtuple('SolveResult', ['grid', 'status', 'stats'])
+
+
+# Reentrant front end to SudokuSolver: holds only the configuration, never the state of a
+# solve, so one instance can serve any number of threads and requests. Every call works on
+# its own copy of the grid, with the lookup tables shared (and built once) per board size.
+class Solver():
+
+    def __init__(self, strategy='copy', backend='bitmask', propagation='singles', timeout=None, max_nodes=None,
+                 stats_hook=None):
+        check_options(strategy, backend, propagation)
+        self.options = {
+            'strategy': strategy, 'backend': backend, 'propagation': propagation,
+            'timeout': timeout, 'max_nodes': max_nodes, 'stats_hook': stats_hook,
+        }
+
+    def solve(self, grid, token=None):
+        puzzle = SudokuSolver(grid, token=token, **self.options)
+        solution = puzzle.solve(render=False)
+        if solution is None:
+            return SolveResult(None, GAVE_UP, puzzle.stats)
+        if solution is False:
+            return SolveResult(None, UNSOLVABLE, puzzle.stats)
+        return SolveResult(solution, SOLVED, puzzle.stats)
+
+    def count_solutions(self, grid, limit=2, token=None):
+        # (solutions found up to limit, or None if a limit was hit first, SolveResult of the first)
+        puzzle = SudokuSolver(grid, token=token, **self.options)
+        found = puzzle.count_solutions(limit)
+        if found is None:
+            return None, SolveResult(None, GAVE_UP, puzzle.stats)
+        if not found:
+            return 0, SolveResult(None, UNSOLVABLE, puzzle.stats)
+        return found, SolveResult(puzzle.problem, SOLVED, puzzle.stats)
+
+
+def solve(grid, **options):
+    # solve(grid) -> SolveResult, without touching grid or any shared state
+    return Solver(**options).solve(grid)
 
 
 if __name__=='__main__':
@@ -151,7 +762,7 @@ if __name__=='__main__':
     # ])
     test_board = np.array([
         [ 8,  5,  9,  6,  1,  2,  4,  3,  7],
-        [ 8,  2,  3,  -1,  5,  4,  1,  6,  9],
+        [ 7,  2,  3,  -1,  5,  4,  1,  6,  9],
         [ 1,  6,  4, -1, -1, -1, -1, -1, -1],
         [-1, -1, -1,  1, -1,  7, -1, -1,  2],
         [ 3, -1,  5, -1, -1, -1,  9, -1, -1],
@@ -160,5 +771,7 @@ if __name__=='__main__':
         [-1,  1,  7, -1, -1, -1, -1, -1, -1],
         [-1, -1, -1, -1,  3,  6, -1,  4, -1],
     ])
-    Solver = SudokuSolver(test_board)
-    print(Solver.solve())
+    for strategy in ('copy', 'trail', 'backjump'):
+        puzzle = SudokuSolver(test_board, strategy=strategy)
+        print(puzzle.solve())
+        print("%s search: %d nodes" % (strategy, puzzle.stats.nodes))
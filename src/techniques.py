@@ -0,0 +1,115 @@
+#!/usr/bin/python3
+import functools
+import itertools
+
+
+# Deductions beyond naked and hidden singles. Each technique only reads the candidate
+# masks and yields (cells, mask) pairs, meaning every digit in mask can be removed from
+# every cell in cells; the caller decides how to apply them.
+
+def union(domains, cells):
+    mask = 0
+    for x in cells:
+        mask |= domains[x]
+    return mask
+
+def naked_singles(domains, tables):
+    # a cell down to one candidate rules that digit out of its peers
+    popcount = tables.popcount
+    for x in tables.cells:
+        if popcount(domains[x]) == 1:
+            others = [y for y in tables.peers[x] if domains[y] & domains[x]]
+            if others:
+                yield others, domains[x]
+
+def hidden_singles(domains, tables):
+    # a digit with one place left in a unit goes there
+    for unit in tables.units:
+        bit = 1
+        while bit <= tables.all_digits:
+            place = None
+            for x in unit:
+                if domains[x] & bit:
+                    if place is not None:
+                        break
+                    place = x
+            else:
+                if place is not None and domains[place] != bit:
+                    yield [place], tables.all_digits & ~bit
+            bit <<= 1
+
+def pointing(domains, tables):
+    # a digit confined to one row or column of a block can't appear elsewhere on that line
+    for shared, block_rest, line_rest in tables.intersections:
+        confined = union(domains, shared) & ~union(domains, block_rest)
+        if confined and union(domains, line_rest) & confined:
+            yield line_rest, confined
+
+def box_line_reduction(domains, tables):
+    # a digit confined to one block along a row or column can't appear elsewhere in that block
+    for shared, block_rest, line_rest in tables.intersections:
+        confined = union(domains, shared) & ~union(domains, line_rest)
+        if confined and union(domains, block_rest) & confined:
+            yield block_rest, confined
+
+def naked_subsets(domains, tables, size):
+    # `size` cells of a unit sharing `size` candidates own those digits within the unit
+    popcount = tables.popcount
+    for unit in tables.units:
+        open_cells = [x for x in unit if 1 < popcount(domains[x]) <= size]
+        for cells in itertools.combinations(open_cells, size):
+            mask = union(domains, cells)
+            if popcount(mask) == size:
+                others = [x for x in unit if x not in cells and domains[x] & mask]
+                if others:
+                    yield others, mask
+
+def hidden_subsets(domains, tables, size):
+    # `size` digits that only fit in the same `size` cells of a unit fill those cells
+    for unit in tables.units:
+        places = {}
+        bit = 1
+        while bit <= tables.all_digits:
+            cells = [x for x in unit if domains[x] & bit]
+            if 1 < len(cells) <= size:
+                places[bit] = cells
+            bit <<= 1
+        for digits in itertools.combinations(places, size):
+            cells = set().union(*(places[bit] for bit in digits))
+            if len(cells) == size:
+                mask = sum(digits)
+                extra = [x for x in cells if domains[x] & ~mask]
+                if extra:
+                    yield extra, tables.all_digits & ~mask
+
+def fish(domains, tables, size):
+    # a digit whose places in `size` rows all fall in the same `size` columns can't appear
+    # elsewhere in those columns, and the other way around: X-wing, swordfish, jellyfish
+    n = tables.size
+    rows, cols = tables.units[:n], tables.units[n:2 * n]
+    bit = 1
+    while bit <= tables.all_digits:
+        for base, cover in ((rows, cols), (cols, rows)):
+            places = {}
+            for i, line in enumerate(base):
+                spots = [j for j, x in enumerate(line) if domains[x] & bit]
+                if 1 < len(spots) <= size:
+                    places[i] = spots
+            for lines in itertools.combinations(places, size):
+                covered = set().union(*(places[i] for i in lines))
+                if len(covered) == size:
+                    others = [x for j in covered for i, x in enumerate(cover[j]) if i not in lines and domains[x] & bit]
+                    if others:
+                        yield others, bit
+        bit <<= 1
+
+
+# cheapest first; propagation restarts from the top whenever one of them makes progress
+TECHNIQUES = (
+    ('pointing', pointing),
+    ('box_line_reduction', box_line_reduction),
+    ('naked_pair', functools.partial(naked_subsets, size=2)),
+    ('hidden_pair', functools.partial(hidden_subsets, size=2)),
+    ('naked_triple', functools.partial(naked_subsets, size=3)),
+    ('hidden_triple', functools.partial(hidden_subsets, size=3)),
+)
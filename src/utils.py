@@ -1,4 +1,10 @@
 import datetime
+import math
+import numpy as np
+
+
+# digits of boards up to 25x25 in the one-line puzzle format; '.' and '0' are blanks
+LINE_SYMBOLS = '123456789ABCDEFGHIJKLMNOP'
 
 
 def strfdelta(tdelta, fmt):
@@ -9,14 +15,45 @@ def strfdelta(tdelta, fmt):
         d[k] = str(v).zfill(2)
     return fmt.format(**d)
 
-def blockno_to_NW_idx(blockno):
-    return ((blockno // 3) * 3, (blockno % 3) * 3)
+def blockno_to_NW_idx(blockno, box=3):
+    return ((blockno // box) * box, (blockno % box) * box)
 
-def idx_to_blockno(row, col):
-    return 3*(row // 3) + (col // 3)
+def idx_to_blockno(row, col, box=3):
+    return box*(row // box) + (col // box)
 
 def some(iterable):
     for i in iterable:
         if i:
             return i
     return False
+
+def board_from_line(line):
+    line = line.strip().upper()
+    size = math.isqrt(len(line))
+    box = math.isqrt(size)
+    if not line or size * size != len(line) or box * box != size or size > len(LINE_SYMBOLS):
+        raise ValueError("Expected 81, 256 or 625 characters, got %d in %r" % (len(line), line))
+    symbols = LINE_SYMBOLS[:size]
+    if any(c not in symbols and c not in '.0' for c in line):
+        raise ValueError("Expected characters from %r, '.' or '0', got %r" % (symbols, line))
+    return np.array([symbols.index(c) + 1 if c not in '.0' else -1 for c in line]).reshape((size, size))
+
+def line_from_board(board):
+    return ''.join(LINE_SYMBOLS[v - 1] if v > 0 else '.' for v in np.asarray(board).flatten())
+
+def is_solution(grid, problem=None):
+    # a completed board, every row, column and block holding each digit once, that keeps
+    # the givens of `problem`
+    grid = np.asarray(grid)
+    size = grid.shape[0] if grid.ndim == 2 else 0
+    box = math.isqrt(size)
+    if not size or grid.shape != (size, size) or box * box != size:
+        return False
+    blocks = grid.reshape((box, box, box, box)).swapaxes(1, 2).reshape((size, size))
+    digits = np.arange(1, size + 1)
+    if not all((np.sort(lines, axis=1) == digits).all() for lines in (grid, grid.T, blocks)):
+        return False
+    if problem is None:
+        return True
+    problem = np.asarray(problem)
+    return problem.shape == grid.shape and bool((grid[problem > 0] == problem[problem > 0]).all())
@@ -0,0 +1,101 @@
+#!/usr/bin/python3
+import numpy as np
+try:
+    import src.constants as constants
+    import src.sudokusolver as solver
+except ModuleNotFoundError:
+    import constants
+    import sudokusolver as solver
+
+
+# 9x9 boards only: the candidate masks are packed into uint16
+TABLES = solver.get_tables(3)
+UNIT_INDEX = np.array(TABLES.units)
+CELL_UNIT_INDEX = np.array(TABLES.cell_unit_ids)
+POPCOUNT = np.array([TABLES.popcount(mask) for mask in range(TABLES.all_digits + 1)], dtype=np.uint8)
+SHAPE = (constants.ROWS, constants.COLUMNS)
+# digit held by a single-candidate mask
+DIGITS = np.array([mask.bit_length() for mask in range(TABLES.all_digits + 1)])
+
+
+# propagates naked and hidden singles for a whole batch of puzzles at once; candidates
+# are an (N, 81) array of the same 9-bit masks SudokuSolver uses, i.e. the (N, 81, 9)
+# boolean tensor packed along the digit axis. Only puzzles that stall fall back to search.
+class VectorSolver():
+
+    def __init__(self, problems, unique=False, **options):
+        self.problems = np.array(problems).reshape((-1, constants.ROWS * constants.COLUMNS))
+        # keyword arguments for the SudokuSolver used on stalled puzzles
+        self.options = options
+        # when set, stalled puzzles with more than one solution are marked in self.multiple
+        # instead of being solved; propagation alone never leaves a choice
+        self.unique = unique
+        givens = self.problems > 0
+        self.candidates = np.full(self.problems.shape, TABLES.all_digits, dtype=np.uint16)
+        self.candidates[givens] = np.left_shift(1, self.problems[givens] - 1)
+        self.dead = np.zeros(self.problems.shape[0], dtype=bool)
+        self.multiple = np.zeros(self.problems.shape[0], dtype=bool)
+        # stalled puzzles whose search hit a limit set in options
+        self.gave_up = np.zeros(self.problems.shape[0], dtype=bool)
+        self.propagated = 0
+        self.searched = 0
+
+    def solve(self):
+        self.propagate()
+        singles = POPCOUNT[self.candidates] == 1
+        solved = ~self.dead & singles.all(axis=1)
+        self.propagated = int(solved.sum())
+
+        digits = np.where(singles, DIGITS[self.candidates], -1)
+        solutions = np.where(solved[:, None], digits, -1)
+        for i in np.flatnonzero(~self.dead & ~solved):
+            board = digits[i].reshape(SHAPE)
+            puzzle = solver.SudokuSolver(board, **self.options)
+            self.searched += 1
+            if self.unique:
+                found = puzzle.count_solutions(2)
+                self.multiple[i] = found is not None and found > 1
+                solution = None if found is None else puzzle.problem if found == 1 else False
+            else:
+                solution = puzzle.solve(render=False)
+            self.gave_up[i] = solution is None
+            if solution is not None and solution is not False:
+                solutions[i] = solution.flatten()
+                solved[i] = True
+        self.solved = solved
+        return solutions.reshape((-1,) + SHAPE)
+
+    def propagate(self):
+        active = ~self.dead
+        while active.any():
+            idx = np.flatnonzero(active)
+            cand = self.candidates[idx]
+
+            # naked singles: drop every placed digit from the peers of its cell
+            placed = np.where(POPCOUNT[cand] == 1, cand, 0)
+            unit_placed = placed[:, UNIT_INDEX]
+            unit_or = np.bitwise_or.reduce(unit_placed, axis=2)
+            dead = (POPCOUNT[unit_placed].sum(axis=2) != POPCOUNT[unit_or]).any(axis=1)
+            peers = np.bitwise_or.reduce(unit_or[:, CELL_UNIT_INDEX], axis=2)
+            cand = np.where(placed > 0, cand, cand & ~peers)
+
+            # hidden singles: a digit with one place left in a unit goes there
+            unit_cand = cand[:, UNIT_INDEX]
+            once = np.zeros(unit_or.shape, dtype=np.uint16)
+            twice = np.zeros(unit_or.shape, dtype=np.uint16)
+            for i in range(unit_cand.shape[2]):
+                twice |= once & unit_cand[:, :, i]
+                once |= unit_cand[:, :, i]
+            dead |= (once != TABLES.all_digits).any(axis=1)
+            once &= ~twice
+            forced = cand & np.bitwise_or.reduce(once[:, CELL_UNIT_INDEX], axis=2)
+            dead |= (POPCOUNT[forced] > 1).any(axis=1)
+            cand = np.where(forced > 0, forced, cand)
+            dead |= (cand == 0).any(axis=1)
+
+            changed = (cand != self.candidates[idx]).any(axis=1)
+            self.candidates[idx] = cand
+            self.dead[idx] |= dead
+            active[idx] = ~dead & changed
+        return self.candidates
+
@@ -1,17 +1,24 @@
 #!/usr/bin/python3 
 import tkinter as tk
-import copy
 import src.constants as constants
 import src.utils as utils
 import src.puzzledetector as pdetector
 import src.sudokusolver as solver
+import src.solvetrace as solvetrace
+import src.board as sudokuboard
 import functools
+import collections
+import itertools
+import threading
+from tkinter import filedialog
 from datetime import datetime, timedelta
-from time import sleep
 import numpy as np
 import pickle
 # 
 
+# the parts of the board the user edits, and undo/redo restores
+USER_FIELDS = ('answers', 'corners', 'centers')
+
 def createSudokuButton(parent, **kwargs):
     buttonArgs = {
         'relief': tk.SOLID,
@@ -63,7 +70,7 @@ class App(tk.Tk):
                 self,
                 # bd=self.winfo_height()//30 if i == 0 else 0,
                 bd=0
-            ) for i in range(3)
+            ) for i in range(5)
         ]
         for gui in self.guis:
             gui.pack(anchor='center')
@@ -100,29 +107,81 @@ class App(tk.Tk):
         capture = createSudokuButton(self.guis[2], text="Solve Problem", command=self._solve_problem)
         capture.pack(side=tk.LEFT, padx=self.winfo_height()//30)
 
-        self.update()
+        cancel = createSudokuButton(self.guis[2], text="Cancel Solve", command=self._cancel_solve)
+        cancel.pack(side=tk.LEFT, padx=self.winfo_height()//30)
+
+        # replay speed in powers of ten of trace entries per frame
+        self.replay_speed = tk.Scale(
+            self.guis[3],
+            from_=0,
+            to=6,
+            resolution=0.5,
+            orient=tk.HORIZONTAL,
+            showvalue=0,
+            length=self.cellwidth * 2,
+            width=12,
+            bd=0,
+        )
+        self.replay_speed.set(constants.REPLAY_SPEED)
+        self.replay_speed.pack(side=tk.LEFT, padx=self.winfo_height()//30)
+
+        skip = createSudokuButton(self.guis[3], text="Skip to End", command=self._skip_replay)
+        skip.pack(side=tk.LEFT, padx=self.winfo_height()//30)
+
+        save = createSudokuButton(self.guis[3], text="Save Trace", command=self._save_trace)
+        save.pack(side=tk.LEFT, padx=self.winfo_height()//30)
+
+        self.scrubber = tk.Scale(
+            self.guis[4],
+            from_=0,
+            to=0,
+            orient=tk.HORIZONTAL,
+            showvalue=0,
+            length=self.columns * self.cellwidth,
+            width=12,
+            bd=0,
+            command=self._scrub,
+        )
+        self.scrubber.pack(side=tk.LEFT)
 
-        self.state = {
-            'board': constants.INITIAL_BOARD,
-            'answers': constants.USER_BOARD,
-            'solver': copy.deepcopy(constants.USER_BOARD),
-            'corners': constants.USER_CORNERS,
-            'centers': constants.USER_CENTERS,
-        }
+        self.update()
 
-        self.solver = solver.SudokuSolver(self.state['board'])
+        self.board = sudokuboard.Board(self.rows)
+
+        self.solver = solver.SudokuSolver(self.board, timeout=constants.SOLVER_TIMEOUT, trace=True)
+        # the running solve: its worker thread, CancellationToken, and (solution, stats)
+        # once the worker is done, until _finish_solve() reports it
+        self.solve_thread = None
+        self.solve_token = None
+        self.solve_result = None
+        # the running validation: its worker thread, CancellationToken, and SolveResult,
+        # or None if it raised
+        self.validate_thread = None
+        self.validate_token = None
+        self.validate_result = None
+        # TracePlayer over the trace of the last solve
+        self.replay = None
+        self.replay_scheduled = False
 
         self.active = (-1, -1)
         self.selected = []
-        self.undo_stack = []
-        self.redo_stack = []
+        # edits as lists of (field, cell, before, after) for the cells they changed
+        self.undo_stack = collections.deque(maxlen=constants.UNDO_LIMIT)
+        self.redo_stack = collections.deque(maxlen=constants.UNDO_LIMIT)
 
+        # canvas items of every cell, created once and reconfigured from then on: its
+        # square, one large digit for the given, answer or solver value, the center marks,
+        # and a pool of corner marks
         self.rect = {}
         self.corners = {}
         self.centers = {}
-        self.answers = {}
-        self.solvers = {}
-        self.givens = {}
+        self.larges = {}
+        # what each cell's items last showed, and the cells whose state changed since
+        self.views = {}
+        self.dirty = set()
+        # answers highlighted by Validate Answers, until they change
+        self.wrong = {}
+        self._create_cells()
         self._refresh_all()
 
         self.canvas.focus_set()
@@ -174,42 +233,184 @@ class App(tk.Tk):
             self.timer_start = datetime.now()
 
     def _validate_solution(self):
-        solution = self.solver.solve(render=False)
+        if self._solving() or self._validating():
+            return
+        # solved in a worker thread like _solve_problem(), so the window stays responsive
+        # and Cancel Solve stops it
+        self.validate_token = solver.CancellationToken()
+        self.validate_result = None
+        self.validate_thread = threading.Thread(
+            target=self._validate_worker, args=(self.solver.problem.copy(), self.validate_token), daemon=True)
+        self.validate_thread.start()
+        self.after(1000 // constants.SOLVER_FPS, self._poll_validation, self.validate_thread)
+
+    def _validate_worker(self, problem, token):
+        result = None
+        try:
+            result = solver.Solver(timeout=constants.SOLVER_TIMEOUT).solve(problem, token=token)
+        finally:
+            self.validate_result = result
+
+    def _poll_validation(self, thread):
+        if thread is not self.validate_thread:
+            return
+        if thread.is_alive():
+            self.after(1000 // constants.SOLVER_FPS, self._poll_validation, thread)
+            return
+        result = self.validate_result
+        self.validate_thread = None
+        self.validate_token = None
+        self.validate_result = None
+        self._finish_validation(None if result is None else result.grid)
+
+    def _finish_validation(self, solution):
+        if solution is None:
+            self._create_popup(text="Couldn't find a solution to check against 😞", **self.popup_dims)
+            return
         incorrect = 0
-        for i in range(solution.shape[0]):
-            for j in range(solution.shape[1]):
-                if solution[i, j] != self.state['answers'][i][j] and self.state['answers'][i][j] > 0:
-                    self._highlight_answer(i, j)
-                    incorrect += 1
+        self._mark_dirty(*self.wrong)
+        self.wrong = {}
+        for i, j in zip(*np.nonzero((self.board.answers > 0) & (self.board.answers != solution))):
+            self._highlight_answer(i, j)
+            incorrect += 1
+        self._redraw_dirty()
         if incorrect:
             self._create_popup(text="%d errors found 😞" % incorrect, **self.popup_dims)
         else:
             self._create_popup(text="Looks good to me! 😃", **self.popup_dims)
 
     def _highlight_answer(self, row, column):
-        if self.state['answers'][row][column] < 0:
+        if self.board.answers[row, column] < 0:
             return
-        else:
-            self.canvas.delete(self.answers[row, column])
-            self.answers[row, column] = self.draw_large(row, column, self.state['answers'][row][column], constants.WRONG_ANSWER_COLOR, tag="answer")
+        self.wrong[row, column] = self.board.answers[row, column]
+        self._mark_dirty((row, column))
 
     def _solve_problem(self):
-        if np.sum(np.array(self.state['board']) > 0) < 8:
+        if self._solving() or self._validating():
+            return
+        if np.sum(self.board.givens > 0) < 8:
             self._create_popup(text="Please make sure at least 8 digits are specified!", **self.popup_dims)
+            return
+        # the solve runs at full speed in a worker thread, recording a trace that
+        # _draw_replay_frame() replays from the Tk event loop a few dozen times a second
+        self.solve_token = solver.CancellationToken()
+        self.solver.token = self.solve_token
+        self.solver.trace = None
+        self.solve_result = None
+        self.replay = None
+        self.solve_thread = threading.Thread(target=self._solve_worker, args=(self.solver,), daemon=True)
+        self.solve_thread.start()
+        self._schedule_replay()
+
+    def _solve_worker(self, puzzle):
+        # always leaves a result, so _finish_solve() runs even if the solve raises
+        solution = None
+        try:
+            solution = puzzle.solve(render=False)
+        except Exception as error:
+            puzzle.stats.gave_up = "error: %s" % error
+            raise
+        finally:
+            self.solve_result = solution, puzzle.stats
+
+    def _schedule_replay(self):
+        if not self.replay_scheduled:
+            self.replay_scheduled = True
+            self.after(1000 // constants.SOLVER_FPS, self._draw_replay_frame, self.solver)
+
+    def _draw_replay_frame(self, puzzle):
+        self.replay_scheduled = False
+        if puzzle is not self.solver:
+            return
+        if self.replay is None:
+            if puzzle.trace is None:
+                # nothing recorded yet, or the solve failed before it could start
+                if self.solve_result is not None:
+                    self._finish_solve(*self.solve_result)
+                elif self._solving():
+                    self._schedule_replay()
+                return
+            self.replay = solvetrace.TracePlayer(puzzle.trace)
+            # the player only reports cells that change from its starting board, so start
+            # from that board: the last solve's digits go, and the cells decided by
+            # propagating the givens show straight away
+            self.board.solver[:] = -1
+            start = self.replay.grid()
+            np.copyto(self.board.solver, start, where=(start > 0) & (self.board.givens <= 0))
+            self._refresh_all()
+        if self.solve_token is not None and self.solve_token.cancelled:
+            self._draw_replay(self.replay.seek(len(self.replay.trace)))
         else:
-            start = datetime.now()
-            self.solver.solve(render=True)
-            end = datetime.now()
-            solve_time = utils.strfdelta(end - start, "{seconds} seconds")
-            if solve_time[:2] == '00':
-                self._create_popup(text="Solved!", **self.popup_dims)
-            else:
-                self._create_popup(text="Solved in %s!" % solve_time, **self.popup_dims)
+            self._draw_replay(self.replay.step(int(10 ** self.replay_speed.get())))
+        # solve_result is only set between the worker finishing and _finish_solve(), so a
+        # replay scrubbed after the solve stops at the end without reporting it again
+        if self.replay.finished and self.solve_result is not None:
+            self._finish_solve(*self.solve_result)
+        elif not self.replay.finished or self._solving():
+            self._schedule_replay()
+
+    def _draw_replay(self, changed):
+        for x, value in changed:
+            row, column = divmod(x, self.columns)
+            if not self.board.given(row, column):
+                self.render_answer(row, column, value or -1)
+        self._redraw_dirty()
+        self.scrubber.configure(to=len(self.replay.trace))
+        self.scrubber.set(self.replay.position)
+
+    def _scrub(self, value):
+        if self.replay is not None and int(float(value)) != self.replay.position:
+            self._draw_replay(self.replay.seek(int(float(value))))
+            self._schedule_replay()
+
+    def _skip_replay(self):
+        if self.replay is not None:
+            self._draw_replay(self.replay.seek(len(self.replay.trace)))
+            self._schedule_replay()
+
+    def _save_trace(self):
+        if self.solver.trace is None:
+            self._create_popup(text="Solve the problem first to record a trace.", **self.popup_dims)
+            return
+        if self.solve_result is None and self._solving():
+            self._create_popup(text="Please wait for the solver to finish.", **self.popup_dims)
+            return
+        path = filedialog.asksaveasfilename(defaultextension='.npz', filetypes=[('Solve traces', '*.npz')])
+        if path:
+            self.solver.trace.save(path)
+
+    def _finish_solve(self, solution, stats):
+        self.solve_thread = None
+        self.solve_token = None
+        self.solve_result = None
+        self.solver.token = None
+        if solution is None:
+            text = "Gave up after %.2f seconds (%s)\n%d search nodes, %d backtracks" % (stats.time, stats.gave_up, stats.nodes, stats.backtracks)
+        elif solution is False:
+            text = "No solution found!\n%d search nodes, %d backtracks" % (stats.nodes, stats.backtracks)
+        else:
+            # the replay ends on the solution unless the trace was cut short
+            for (row, column), value in np.ndenumerate(solution):
+                if not self.board.given(row, column) and self.board.solver[row, column] != value:
+                    self.render_answer(row, column, int(value))
+            self._redraw_dirty()
+            text = "Solved in %.2f seconds!\n%d search nodes, %d backtracks" % (stats.time, stats.nodes, stats.backtracks)
+        self._create_popup(text=text, **self.popup_dims)
+
+    def _cancel_solve(self):
+        for token in (self.solve_token, self.validate_token):
+            if token is not None:
+                token.cancel()
+
+    def _solving(self):
+        return self.solve_thread is not None
+
+    def _validating(self):
+        return self.validate_thread is not None
 
     def _capture_problem(self):
         detect = pdetector.SudokuDetector(True)
-        board = np.maximum(self.state['board'], self.state['answers'])
-        if np.max(board) > 0:
+        if np.max(self.board.filled()) > 0:
             self._create_popup(text="You can only capture a problem on an empty board!", **self.popup_dims)
             return
         self._create_popup(text="Please select the Sudoku grid with your mouse.", **self.popup_dims)
@@ -259,14 +460,14 @@ class App(tk.Tk):
             self.update_idletasks()
 
         res = res.reshape((self.rows, self.columns)).transpose()
-        self.state['answers'] = res
+        self.board.answers[:] = res
         self._refresh_all()
         self._create_popup(text="Please double check and make corrections.", **self.popup_dims)
 
     def _check_solution(self):
         self.clock_running = False
         to_check = [[0] * self.columns] * self.rows
-        answer = np.maximum(np.maximum(self.state['board'], self.state['answers']), self.state['solver'])
+        answer = self.board.combined()
         if np.min(answer) < 1:
             self._create_popup(text="Please fill in all the blank spaces first!", width=500, height=200)
             return
@@ -290,13 +491,19 @@ class App(tk.Tk):
             self._create_popup(text="Congrats! You finished the puzzle in %s" % final_time, width=700, height=200)
 
     def _set_problem(self):
+        self._cancel_solve()
+        for thread in (self.solve_thread, self.validate_thread):
+            if thread is not None:
+                thread.join()
+        self.solve_thread = self.validate_thread = None
+        self.solve_token = self.validate_token = None
+        self.solve_result = None
+        self.replay = None
         self.time = timedelta(seconds=0)
         del self.solver
         self.clock_running = True
-        for i in range(len(self.state['board'])):
-            for j in range(len(self.state['board'][0])):
-                self.state['board'][i][j] = self.state['answers'][i][j] if self.state['board'][i][j] < 0 else self.state['board'][i][j]
-        self.solver = solver.SudokuSolver(self.state['board'], renderer=self.render_answer)
+        self.board.set_problem()
+        self.solver = solver.SudokuSolver(self.board, timeout=constants.SOLVER_TIMEOUT, trace=True)
         self._refresh_all()
 
     def _save_problem(self):
@@ -306,7 +513,7 @@ class App(tk.Tk):
         f = None
         if f is None:
             return
-        pickle.dump(self.state, f)
+        pickle.dump(self.board, f)
         f.close()
 
     def _create_popup(self, text, width=None, height=None, font=None, x_offset=0, y_offset=0):
@@ -348,86 +555,130 @@ class App(tk.Tk):
             self.update_idletasks()
 
     def _backspace_callback(self, event):
-        self._add_to_undo()
+        edit = self._start_edit(self.selected)
         for k in self.selected:
-            self.state['answers'][k[0]][k[1]] = -1
-            self._refresh_all()
+            self.board.answers[k] = -1
+            self._mark_dirty(k)
+        self._add_to_undo(edit)
+        self._redraw_dirty()
 
     def _delete_callback(self, event):
-        self._add_to_undo()
+        edit = self._start_edit(self.selected)
         for k in self.selected:
-            self.state['answers'][k[0]][k[1]] = -1
-            self.state['centers'][k[0]][k[1]] = set()
-            self.state['corners'][k[0]][k[1]] = set()
-            self._refresh_all()
-
-    def _refresh_all(self):
-        self.canvas.delete("answer")
-        self.canvas.delete("solver")
-        self.canvas.delete("corner")
-        self.canvas.delete("center")
+            self.board.answers[k] = -1
+            self.board.centers[k] = 0
+            self.board.corners[k] = 0
+            self._mark_dirty(k)
+        self._add_to_undo(edit)
+        self._redraw_dirty()
+
+    def _create_cells(self):
         for column in range(self.columns):
             for row in range(self.rows):
                 self.rect[row, column] = self.draw_square(row, column)
                 self.corners[row, column] = self.draw_corner(row, column)
                 self.centers[row, column] = self.draw_center(row, column)
-                self.answers[row, column] = self.draw_large(row, column, self.state['answers'][row][column], constants.ANSWER_COLOR, tag="answer")
-                self.solvers[row, column] = self.draw_large(row, column, self.state['solver'][row][column], constants.SOLVER_COLOR, tag="solver")
-                self.givens[row, column] = self.draw_large(row, column, self.state['board'][row][column], constants.GIVEN_COLOR)
+                self.larges[row, column] = self.draw_large(row, column)
         for i in [0, 3, 6]:
             _ = self.canvas.create_line(i * self.cellwidth, 0, i * self.cellwidth, 9 * self.cellwidth, fill=constants.OUTLINE_COLOR, width=6)
             _ = self.canvas.create_line(0, i * self.cellwidth, 9 * self.cellwidth, i * self.cellwidth, fill=constants.OUTLINE_COLOR, width=6)
+
+    def _refresh_all(self):
+        # for changes all over the board; cells that still look the same aren't touched
+        self._mark_dirty(*self.rect)
+        self._redraw_dirty()
         self._highlight_selected()
 
+    def _mark_dirty(self, *cells):
+        self.dirty.update(cells)
+
+    def _redraw_dirty(self):
+        for cell in self.dirty:
+            view = self._cell_view(*cell)
+            last = self.views.get(cell, (None, None, None, ()))
+            if view[:2] != last[:2]:
+                self.canvas.itemconfig(self.larges[cell], text=view[0], fill=view[1])
+            if view[2] != last[2]:
+                self.canvas.itemconfig(self.centers[cell], text=view[2])
+            for item, text, old in itertools.zip_longest(self.corners[cell], view[3], last[3], fillvalue=''):
+                if text != old:
+                    self.canvas.itemconfig(item, text=text)
+            self.views[cell] = view
+        self.dirty.clear()
+
+    def _cell_view(self, row, column):
+        # (large digit, its color, center marks, corner marks) shown in a cell: a given wins
+        # over a solver value, which wins over an answer, and marks only show in empty cells
+        given = self.board.givens[row, column]
+        solved = self.board.solver[row, column]
+        answer = self.board.answers[row, column]
+        if given > 0:
+            large, color = str(given), constants.GIVEN_COLOR
+        elif solved > 0:
+            large, color = str(solved), constants.SOLVER_COLOR
+        elif answer > 0:
+            large = str(answer)
+            color = constants.WRONG_ANSWER_COLOR if self.wrong.get((row, column)) == answer else constants.ANSWER_COLOR
+        else:
+            large, color = '', constants.ANSWER_COLOR
+        if large:
+            return large, color, '', ()
+        center = ''.join([str(n) for n in self.board.digits(self.board.centers[row, column])])
+        corners = tuple(str(n) for n in self.board.digits(self.board.corners[row, column]))
+        return large, color, center, corners
+
     def _copy_callback(self, event):
-        r, c = self.active
-        self.clipboard = { k: copy.deepcopy(self.state[k][r][c]) for k in self.state.keys() if k not in ['board', 'solver'] }
+        self.clipboard = { k: getattr(self.board, k)[self.active] for k in USER_FIELDS }
 
     def _cut_callback(self, event):
-        r, c = self.active
-        self.clipboard = { k: copy.deepcopy(self.state[k][r][c]) for k in self.state.keys() if k not in ['board', 'solver'] }
-        for k in self.state.keys():
-            if k not in ['board', 'solver']:
-                if k == 'answers':
-                    self.state[k][r][c] = -1
-                else:
-                    self.state[k][r][c] = set()
-        self._refresh_all()
+        self.clipboard = { k: getattr(self.board, k)[self.active] for k in USER_FIELDS }
+        edit = self._start_edit([self.active])
+        self.board.answers[self.active] = -1
+        self.board.corners[self.active] = 0
+        self.board.centers[self.active] = 0
+        self._add_to_undo(edit)
+        self._mark_dirty(self.active)
+        self._redraw_dirty()
 
     def _paste_callback(self, event):
-        self._add_to_undo(reset_redo=True)
-        r, c = self.active
+        edit = self._start_edit([self.active])
         for k, v in self.clipboard.items():
-            self.state[k][r][c] = copy.deepcopy(v)
-        self._refresh_all()
+            getattr(self.board, k)[self.active] = v
+        self._add_to_undo(edit)
+        self._mark_dirty(self.active)
+        self._redraw_dirty()
 
     def _undo_callback(self, event):
         if len(self.undo_stack):
-            self._add_to_redo()
-            last_state = self.undo_stack.pop()
-            self.state = last_state
-            self._refresh_all()
+            changes = self.undo_stack.pop()
+            self._apply_changes(changes, undo=True)
+            self.redo_stack.append(changes)
 
     def _redo_callback(self, event):
         if len(self.redo_stack):
-            self._add_to_undo(reset_redo=False)
-            last_state = self.redo_stack.pop()
-            self.state['corners'] = last_state['corners']
-            self.state['centers'] = last_state['centers']
-            self.state['answers'] = last_state['answers']
-            self._refresh_all()
-
-    def _add_to_undo(self, reset_redo=True):
-        self.undo_stack += [copy.deepcopy(self.state)]
-        if len(self.undo_stack) > 100:
-            self.undo_stack.pop(0)
-        if reset_redo:
-            self.redo_stack = []
-
-    def _add_to_redo(self):
-        self.redo_stack += [copy.deepcopy(self.state)]
-        if len(self.redo_stack) > 100:
-            self.redo_stack.pop(0)
+            changes = self.redo_stack.pop()
+            self._apply_changes(changes, undo=False)
+            self.undo_stack.append(changes)
+
+    def _start_edit(self, cells):
+        # what the user fields of `cells` hold before an edit, for _add_to_undo() to diff against
+        return [(k, cell, getattr(self.board, k)[cell]) for cell in set(cells) for k in USER_FIELDS]
+
+    def _add_to_undo(self, edit):
+        changes = []
+        for k, cell, before in edit:
+            after = getattr(self.board, k)[cell]
+            if after != before:
+                changes.append((k, cell, before, after))
+        if changes:
+            self.undo_stack.append(changes)
+            self.redo_stack.clear()
+
+    def _apply_changes(self, changes, undo):
+        for k, cell, before, after in changes:
+            getattr(self.board, k)[cell] = before if undo else after
+            self._mark_dirty(cell)
+        self._redraw_dirty()
 
     def _key_callback(self, event, control):
         shift = False
@@ -442,40 +693,25 @@ class App(tk.Tk):
         else:
             if not self.clock_running:
                 self.clock_running = True
-            self._add_to_undo()
+        edit = self._start_edit(self.selected)
         if control:
             for cell in self.selected:
-                self.state['answers'][cell[0]][cell[1]] = -1
-                self.canvas.delete(self.answers[cell])
-                if keysym not in self.state['centers'][cell[0]][cell[1]]:
-                    self.state['centers'][cell[0]][cell[1]].add(keysym)
-                else:
-                    self.state['centers'][cell[0]][cell[1]].remove(keysym)
-                self.centers[cell] = self.draw_center(cell[0], cell[1])
-                self.corners[cell] = self.draw_corner(cell[0], cell[1])
+                self.board.answers[cell] = -1
+                self.board.toggle(self.board.centers, cell[0], cell[1], keysym)
+                self._mark_dirty(cell)
         if shift:
             for cell in self.selected:
-                self.canvas.delete(self.answers[cell])
-                self.state['answers'][cell[0]][cell[1]] = -1
-                for k in self.corners[cell]:
-                    self.canvas.delete(k)
-                if int(keysym) not in self.state['corners'][cell[0]][cell[1]]:
-                    self.state['corners'][cell[0]][cell[1]].add(keysym)
-                else:
-                    self.state['corners'][cell[0]][cell[1]].remove(keysym)
-                self.corners[cell] = self.draw_corner(cell[0], cell[1])
-                self.centers[cell] = self.draw_center(cell[0], cell[1])
+                self.board.answers[cell] = -1
+                self.board.toggle(self.board.corners, cell[0], cell[1], keysym)
+                self._mark_dirty(cell)
         elif not (shift or control):
             for cell in self.selected:
-                self.state['answers'][cell[0]][cell[1]] = keysym
-                self.canvas.delete(self.answers[cell])
-                self.answers[cell] = self.draw_large(cell[0], cell[1], keysym, color=constants.ANSWER_COLOR, tag="answer")
-                self.corners[cell] = self.draw_corner(cell[0], cell[1])
-                self.centers[cell] = self.draw_center(cell[0], cell[1])
-            if np.min(
-                np.maximum(self.state['board'], self.state['answers'])
-            ) > 0:
-                self._check_solution()
+                self.board.answers[cell] = keysym
+                self._mark_dirty(cell)
+        self._add_to_undo(edit)
+        self._redraw_dirty()
+        if not (shift or control) and np.min(self.board.filled()) > 0:
+            self._check_solution()
 
     def _dir_callback(self, event, shift, direction):
         if self.active[0] < 0 and self.active[1] < 0:
@@ -484,7 +720,7 @@ class App(tk.Tk):
             self.clock_running = True
         new_rc = self._get_new_coords(direction, self.active)
         counter = 0
-        while self.state['board'][new_rc[0]][new_rc[1]] > 0 and counter < 9:
+        while self.board.given(*new_rc) and counter < 9:
             new_rc = self._get_new_coords(direction, new_rc)
             counter += 1
         if not shift:
@@ -507,7 +743,7 @@ class App(tk.Tk):
 
     def _lmb_callback(self, event):
         row, col = self._coords_rc(event.x, event.y)
-        if self.state['board'][row][col] != -1:
+        if row < 0 or self.board.given(row, col):
             return
         if not self.clock_running:
             self.clock_running = True
@@ -519,11 +755,10 @@ class App(tk.Tk):
 
     def _clmb_callback(self, event):
         row, col = self._coords_rc(event.x, event.y)
-        if self.state['board'][row][col] != -1:
+        if row < 0 or self.board.given(row, col):
             return
         if not self.clock_running:
             self.clock_running = True
-        row, col = self._coords_rc(event.x, event.y)
         if row >= 0 and col >= 0:
             self._set_active((row, col))
             self.selected += [(row, col)]
@@ -557,8 +792,9 @@ class App(tk.Tk):
             outline=constants.ACTIVE_OUTLINE_COLOR,
         )
     def _coords_rc(self, x, y):
-        if (x // self.cellheight > 8) or (y // self.cellheight > 8):
-            return False, False
+        # (-1, -1) off the board
+        if not (0 <= x // self.cellwidth < self.columns and 0 <= y // self.cellheight < self.rows):
+            return -1, -1
         return ( y // self.cellheight, x // self.cellwidth )
 
     def _rc_coords(self, row, column, size=None):
@@ -596,22 +832,9 @@ class App(tk.Tk):
                 self.cellwidth*0.5 + y_offset,
             )
 
-    def _rc_filled(self, row, column):
-        return (
-            self.state['board'][row][column] > 0 or
-            self.state['answers'][row][column] > 0 or
-            self.state['solver'][row][column] > 0
-        ) 
-
     def render_answer(self, row, column, value):
-        self.state['solver'][row][column] = value
-        self.canvas.delete(self.solvers[row, column])
-        self.canvas.delete('answer')
-        self.canvas.delete('corner')
-        self.canvas.delete('center')
-        self.solvers[row, column] = self.draw_large(row, column, self.state['solver'][row][column], constants.SOLVER_COLOR, tag="solver")
-        self.canvas.update_idletasks()
-        sleep(constants.SOLVER_SLEEP)
+        self.board.solver[row, column] = value
+        self._mark_dirty((row, column))
 
     def draw_square(self, row, column, size=None, width=1):
         size = size or self.cellwidth
@@ -627,54 +850,38 @@ class App(tk.Tk):
             tags="rect",
         )
 
-    def draw_large(self, row, column, num, color, tag="board"):
-        if num < 0:
-            return 
+    def draw_large(self, row, column):
         x1, y1, x2, y2 = self._rc_coords(row, column)
-        text = str(num)
         return self.canvas.create_text(
             x1 + self.cellwidth * 0.5,
             y1 + self.cellheight * 0.5,
-            text=text,
+            text='',
             font=constants.ANSWER_FONT,
-            fill=color,
-            tag=tag,
+            fill=constants.ANSWER_COLOR,
+            tag="large",
         )
 
     def draw_center(self, row, column):
-        try:
-            self.canvas.delete(self.centers[row, column])
-        except KeyError:
-            pass
         x1, y1, x2, y2 = self._rc_coords(row, column)
-        nums = self.state['centers'][row][column]
-        text = ''.join([str(n) for n in sorted(nums)]) if not self._rc_filled(row, column) else ''
         return self.canvas.create_text(
             x1 + self.cellwidth * 0.5,
             y1 + self.cellheight * 0.52,
-            text=text,
+            text='',
             font=("texgyreheros", self.fontsizes['center']),
             fill="gray",
             tag="center",
         )
 
     def draw_corner(self, row, column):
-        texts = []
-        try:
-            for k in self.corners[row, column]:
-                self.canvas.delete(k)
-        except KeyError:
-            pass
-        if self._rc_filled(row, column):
-            return texts
+        # one item per digit; past the eighth they wrap around the corners again
         x1, y1, x2, y2 = self._rc_coords(row, column)
-        nums = self.state['corners'][row][column]
-        for i, n in enumerate(sorted(nums)):
+        texts = []
+        for i in range(self.rows):
             dx, dy = self._idx_corner_offset(i)
             texts += [self.canvas.create_text(
                 x1 + dx,
                 y1 + dy,
-                text=str(n),
+                text='',
                 font=("texgyreheros", self.fontsizes['corner']),
                 fill="gray",
                 tag="corner",
@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+import math
+import os
+import random
+import numpy as np
+import pytest
+import src.batchsolver as batchsolver
+import src.solutioncache as solutioncache
+import src.sudokusolver as solver
+import src.utils as utils
+
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'resources', 'puzzles')
+
+
+def read_corpus(name):
+    with open(os.path.join(CORPUS_DIR, name + '.txt')) as f:
+        return list(batchsolver.read_puzzles(f))
+
+# each symmetry applied alone to a board, blanks (-1) left as they are
+def relabelled(board, rng):
+    digits = np.arange(board.shape[0] + 1)
+    digits[1:] = rng.sample(range(1, board.shape[0] + 1), board.shape[0])
+    return np.where(board > 0, digits[np.maximum(board, 0)], board)
+
+def transposed(board, rng):
+    return board.T.copy()
+
+def bands_swapped(board, rng):
+    box = math.isqrt(board.shape[0])
+    bands = rng.sample(range(box), box)
+    return board[[band * box + i for band in bands for i in range(box)]]
+
+def stacks_swapped(board, rng):
+    return bands_swapped(board.T, rng).T.copy()
+
+def rows_swapped(board, rng):
+    box = math.isqrt(board.shape[0])
+    return board[[band * box + i for band in range(box) for i in rng.sample(range(box), box)]]
+
+def everything(board, rng):
+    for symmetry in (relabelled, transposed, bands_swapped, stacks_swapped, rows_swapped):
+        board = symmetry(board, rng)
+    return board
+
+SYMMETRIES = [relabelled, transposed, bands_swapped, stacks_swapped, rows_swapped, everything]
+
+def puzzles():
+    return read_corpus('hard')[:5] + read_corpus('16x16')[:2]
+
+
+@pytest.mark.parametrize('symmetry', SYMMETRIES, ids=lambda symmetry: symmetry.__name__)
+@pytest.mark.parametrize('line', puzzles())
+def test_variant_hits_and_maps_back(line, symmetry):
+    rng = random.Random(line)
+    board = utils.board_from_line(line)
+    cache = solutioncache.SolutionCache()
+    cache.solve(board)
+    for _ in range(3):
+        variant = symmetry(board, rng)
+        hits = cache.hits
+        solution = cache.solve(variant)
+        assert cache.hits == hits + 1
+        # the corpus puzzles are unique, so the mapped solution must be the variant's one
+        assert np.array_equal(solution, solver.SudokuSolver(variant).solve(render=False))
+
+
+def test_no_solution_is_cached():
+    board = utils.board_from_line(read_corpus('hard')[0])
+    row, col = [cell for cell in zip(*np.nonzero(board > 0))][0]
+    board[row, (col + 1) % 9] = board[row, col]
+    cache = solutioncache.SolutionCache()
+    assert cache.solve(board) is False
+    assert cache.solve(everything(board, random.Random(1))) is False
+    assert cache.hits == 1
+
+
+def test_shelve_round_trip(tmp_path):
+    path = str(tmp_path / 'solutions')
+    rng = random.Random(1)
+    boards = [utils.board_from_line(line) for line in puzzles()]
+    with solutioncache.SolutionCache(path=path) as cache:
+        for board in boards:
+            cache.solve(board)
+    with solutioncache.SolutionCache(path=path) as cache:
+        for board in boards:
+            variant = everything(board, rng)
+            solution = cache.solve(variant)
+            assert np.array_equal(solution, solver.SudokuSolver(variant).solve(render=False))
+        assert cache.misses == 0 and cache.hits == len(boards)
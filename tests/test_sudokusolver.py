@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+import itertools
+import os
+import random
+import numpy as np
+import pytest
+import src.batchsolver as batchsolver
+import src.sudokusolver as solver
+import src.utils as utils
+
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'resources', 'puzzles')
+
+# every other search, compared against the plain copying search with singles
+CONFIGS = {
+    'trail': {'strategy': 'trail'},
+    'backjump': {'strategy': 'backjump'},
+    'dlx': {'backend': 'dlx'},
+    'advanced': {'propagation': 'advanced'},
+    'trail-advanced': {'strategy': 'trail', 'propagation': 'advanced'},
+    'backjump-advanced': {'strategy': 'backjump', 'propagation': 'advanced'},
+    'dlx-advanced': {'backend': 'dlx', 'propagation': 'advanced'},
+}
+
+# solutions counted per board; more than the adversarial corpus's multi-solution board has
+COUNT_LIMIT = 4
+
+
+def read_corpus(name):
+    with open(os.path.join(CORPUS_DIR, name + '.txt')) as f:
+        return list(batchsolver.read_puzzles(f))
+
+def perturbed_boards(seed=1, count=8):
+    # from the hard corpus: a few givens blanked (usually several solutions), one given
+    # changed (usually none), and a digit repeated in a row (contradicts the givens)
+    rng = random.Random(seed)
+    boards = []
+    for line in read_corpus('hard')[:count]:
+        board = utils.board_from_line(line)
+        givens = list(zip(*np.nonzero(board > 0)))
+        blanked = board.copy()
+        for cell in rng.sample(givens, 5):
+            blanked[cell] = -1
+        changed = board.copy()
+        cell = rng.choice(givens)
+        changed[cell] = rng.choice([d for d in range(1, 10) if d != board[cell]])
+        repeated = board.copy()
+        row, col = givens[0]
+        repeated[row, (col + 1) % 9] = board[row, col]
+        boards += [utils.line_from_board(b) for b in (blanked, changed, repeated)]
+    return boards
+
+# corpus boards with one given changed on which the backjumping search cuts branches with
+# its nogoods; on the corpora themselves it never gets to
+PRUNING = [
+    '34F..DB.5G689..22..C....1D.B4...1B.EC...3...8.D55..67F4.2A...E..B..D.E..46F..GC..1EA.C.8..D.5F....'
+    '....3B.CG....9.2.GF.5..EA....B...3.B.D..5....AD7.12.E.......8...9..8C...1.6.4.....34.FA..E7..D.F.B..'
+    'DE.54.A.2..G..B...C..AD......8...6.19.FB.7.D1..2.C.....456',
+    '52...6.........7.13...........4..8..6......5...........418.........6..2...87.....',
+    '.....6....59.....82....1....45........3........6..3.54...325..6..................',
+]
+
+def boards():
+    cases = [(name, line) for name in ('easy', 'hard', '16x16', 'adversarial') for line in read_corpus(name)]
+    return cases + [('perturbed', line) for line in perturbed_boards()] + [('pruning', line) for line in PRUNING]
+
+# the adversarial corpus's 17-clue board with several solutions takes the singles-only
+# searches about half a minute; it is checked with advanced propagation instead
+SLOW = read_corpus('adversarial')[-1]
+
+def reference_options(line):
+    return {'propagation': 'advanced'} if line == SLOW else {}
+
+
+@pytest.mark.parametrize('config', list(CONFIGS))
+@pytest.mark.parametrize('corpus, line', boards())
+def test_searches_agree(corpus, line, config):
+    options = CONFIGS[config]
+    if line == SLOW and options.get('propagation') != 'advanced' and options.get('backend') != 'dlx':
+        pytest.skip("too slow without advanced propagation")
+    board = utils.board_from_line(line)
+    count = solver.SudokuSolver(board, **reference_options(line)).count_solutions(COUNT_LIMIT)
+    expected = solver.SudokuSolver(board, **reference_options(line)).solve(render=False)
+    assert solver.SudokuSolver(board, **options).count_solutions(COUNT_LIMIT) == count
+    solution = solver.SudokuSolver(board, **options).solve(render=False)
+    if count == 0:
+        assert solution is False and expected is False
+    elif count == 1:
+        assert np.array_equal(solution, expected)
+    else:
+        # with several solutions each search may find a different one
+        assert utils.is_solution(solution, board)
+
+
+class PruneRecorder(solver.SudokuSolver):
+    # keeps every branch a nogood cut: the decided cells and the value it was about to try
+
+    def check_nogoods(self, domains, x, val, levelbit):
+        blame = super().check_nogoods(domains, x, val, levelbit)
+        if blame is not None:
+            decided = [(y, mask.bit_length()) for y, mask in enumerate(domains) if not mask & (mask - 1)]
+            self.pruned.add(tuple(decided) + ((x, val),))
+        return blame
+
+def has_solution_with(board, decisions):
+    trial = board.flatten()
+    for x, val in decisions:
+        trial[x] = val
+    return solver.SudokuSolver(trial.reshape(board.shape), backend='dlx').solve(render=False) is not False
+
+def test_nogoods_keep_every_solution():
+    # a learned nogood is a set of decisions no solution makes all of, so the board with
+    # them filled in must have no solution, and neither may any branch one cuts; the slow
+    # board runs on a node budget
+    learned, pruned = set(), set()
+    lines = read_corpus('hard') + read_corpus('adversarial') + perturbed_boards() + PRUNING
+    for line, propagation in itertools.product(lines, ('singles', 'advanced')):
+        board = utils.board_from_line(line)
+        puzzle = PruneRecorder(board, strategy='backjump', propagation=propagation,
+                               max_nodes=20000 if line == SLOW else None)
+        puzzle.pruned = set()
+        puzzle.solve(render=False)
+        # boards that contradict their givens never start the search
+        nogoods = set(getattr(puzzle, 'nogoods', ()))
+        for nogood in nogoods:
+            assert not has_solution_with(board, nogood), (line, nogood)
+        for branch in puzzle.pruned:
+            assert not has_solution_with(board, branch), (line, branch)
+        learned |= {(line, nogood) for nogood in nogoods}
+        pruned |= {(line, branch) for branch in puzzle.pruned}
+    assert learned and pruned
+
+
+@pytest.mark.parametrize('backend', ['bitmask', 'dlx'])
+def test_iter_solutions_is_lazy(backend):
+    # a blank board has about 6.7e21 solutions, so only a lazy search gets past the first
+    puzzle = solver.SudokuSolver(np.full((9, 9), -1), backend=backend)
+    solutions = puzzle.iter_solutions()
+    assert puzzle.stats.nodes == 0
+    first = next(solutions)
+    nodes = puzzle.stats.nodes
+    second = next(solutions)
+    assert utils.is_solution(first) and utils.is_solution(second)
+    assert not np.array_equal(first, second)
+    assert puzzle.stats.nodes - nodes < 100
+    solutions.close()
+    assert puzzle.stats.solutions == 2
+
+
+# blank boards search a full grid's worth of levels deep, one frame per level
+@pytest.mark.parametrize('size', [16, 25])
+@pytest.mark.parametrize('options', [{}, {'propagation': 'advanced'}, {'strategy': 'trail'},
+                                     {'strategy': 'backjump'}, {'backend': 'dlx'}])
+def test_blank_board(size, options):
+    puzzle = solver.SudokuSolver(np.full((size, size), -1), **options)
+    solution = puzzle.solve(render=False)
+    assert solution is not None and solution is not False
+    assert utils.is_solution(solution)